@@ -20,10 +20,16 @@ fileConfig(config.config_file_name)
 # target_metadata = None
 
 from stack_datamodel import SQLModel  # noqa
+from stack_shared_tasks.backends import RESULT_TABLES  # noqa
 from app.core.config import settings # noqa
 
 target_metadata = [SQLModel.metadata, ResultModelBase.metadata]
 
+
+def include_object(object, name, type_, reflected, compare_to):
+    # The tables of the streaming tasks and profiles belong to the results database, which creates them
+    return not (type_ == "table" and name in {table.name for table in RESULT_TABLES})
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -48,7 +54,8 @@ def run_migrations_offline():
     """
     url = get_url()
     context.configure(
-        url=url, target_metadata=target_metadata, literal_binds=True, compare_type=True
+        url=url, target_metadata=target_metadata, literal_binds=True, compare_type=True,
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -72,7 +79,8 @@ def run_migrations_online():
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata, compare_type=True
+            connection=connection, target_metadata=target_metadata, compare_type=True,
+            include_object=include_object,
         )
 
         with context.begin_transaction():
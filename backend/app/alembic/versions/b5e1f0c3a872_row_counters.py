@@ -0,0 +1,135 @@
+"""Row counters maintained by triggers
+
+Revision ID: b5e1f0c3a872
+Revises: 9dd23505d377
+Create Date: 2026-10-19 01:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e1f0c3a872'
+down_revision = '9dd23505d377'
+branch_labels = None
+depends_on = None
+
+# Slots of the counter of a table: each statement adds to a random slot, so that concurrent writers of the table
+# rarely wait for each other, and the count is their sum
+TABLE_COUNT_SLOTS = 16
+
+# Statement-level triggers: a bulk statement updates each counter once. So that concurrent statements do not deadlock
+# on the counters of their owners, the existing ones are locked first in owner order (an UPDATE ... FROM join updates
+# its rows in no particular order) and the new ones are inserted in owner order.
+ITEM_COUNT_FUNCTIONS = f"""
+CREATE FUNCTION add_table_count(name text, delta bigint) RETURNS void LANGUAGE sql AS $$
+    INSERT INTO tablecount (table_name, slot, count) VALUES (name, floor(random() * {TABLE_COUNT_SLOTS}), delta)
+    ON CONFLICT (table_name, slot) DO UPDATE SET count = tablecount.count + excluded.count;
+$$;
+
+CREATE FUNCTION item_count_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM 1 FROM itemcount WHERE owner_id IN (SELECT owner_id FROM new_rows) ORDER BY owner_id FOR UPDATE;
+    INSERT INTO itemcount (owner_id, count)
+    SELECT owner_id, count(*) FROM new_rows GROUP BY owner_id ORDER BY owner_id
+    ON CONFLICT (owner_id) DO UPDATE SET count = itemcount.count + excluded.count;
+    PERFORM add_table_count('item', (SELECT count(*) FROM new_rows));
+    RETURN NULL;
+END $$;
+
+CREATE FUNCTION item_count_delete() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM 1 FROM itemcount WHERE owner_id IN (SELECT owner_id FROM old_rows) ORDER BY owner_id FOR UPDATE;
+    UPDATE itemcount SET count = itemcount.count - deleted.count
+    FROM (SELECT owner_id, count(*) AS count FROM old_rows GROUP BY owner_id) AS deleted
+    WHERE itemcount.owner_id = deleted.owner_id;
+    PERFORM add_table_count('item', -(SELECT count(*) FROM old_rows));
+    RETURN NULL;
+END $$;
+
+CREATE FUNCTION item_count_update() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    -- Items moved to another owner
+    PERFORM 1 FROM itemcount WHERE owner_id IN (
+        SELECT old_rows.owner_id FROM old_rows JOIN new_rows USING (id) WHERE old_rows.owner_id <> new_rows.owner_id
+        UNION SELECT new_rows.owner_id FROM old_rows JOIN new_rows USING (id) WHERE old_rows.owner_id <> new_rows.owner_id
+    ) ORDER BY owner_id FOR UPDATE;
+    UPDATE itemcount SET count = itemcount.count - moved.count
+    FROM (
+        SELECT old_rows.owner_id, count(*) AS count FROM old_rows JOIN new_rows USING (id)
+        WHERE old_rows.owner_id <> new_rows.owner_id GROUP BY old_rows.owner_id
+    ) AS moved
+    WHERE itemcount.owner_id = moved.owner_id;
+    INSERT INTO itemcount (owner_id, count)
+    SELECT new_rows.owner_id, count(*) FROM old_rows JOIN new_rows USING (id)
+    WHERE old_rows.owner_id <> new_rows.owner_id GROUP BY new_rows.owner_id ORDER BY new_rows.owner_id
+    ON CONFLICT (owner_id) DO UPDATE SET count = itemcount.count + excluded.count;
+    RETURN NULL;
+END $$;
+
+CREATE FUNCTION user_count_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM add_table_count('user', (SELECT count(*) FROM new_rows));
+    RETURN NULL;
+END $$;
+
+CREATE FUNCTION user_count_delete() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM add_table_count('user', -(SELECT count(*) FROM old_rows));
+    RETURN NULL;
+END $$;
+"""
+
+TRIGGERS = """
+CREATE TRIGGER item_count_insert AFTER INSERT ON item
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION item_count_insert();
+CREATE TRIGGER item_count_delete AFTER DELETE ON item
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION item_count_delete();
+CREATE TRIGGER item_count_update AFTER UPDATE ON item
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION item_count_update();
+CREATE TRIGGER user_count_insert AFTER INSERT ON "user"
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION user_count_insert();
+CREATE TRIGGER user_count_delete AFTER DELETE ON "user"
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION user_count_delete();
+"""
+
+
+def upgrade():
+    op.create_table('itemcount',
+        sa.Column('owner_id', sa.Uuid(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('owner_id'),
+    )
+    op.create_table('tablecount',
+        sa.Column('table_name', sqlmodel.sql.sqltypes.AutoString(length=63), nullable=False),
+        sa.Column('slot', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('table_name', 'slot'),
+    )
+    op.execute(ITEM_COUNT_FUNCTIONS)
+    # No writes between the initial counts and the triggers
+    op.execute('LOCK TABLE item, "user" IN SHARE ROW EXCLUSIVE MODE')
+    op.execute(TRIGGERS)
+    op.execute("INSERT INTO itemcount (owner_id, count) SELECT owner_id, count(*) FROM item GROUP BY owner_id")
+    op.execute(
+        "INSERT INTO tablecount (table_name, slot, count) "
+        "SELECT 'item', 0, count(*) FROM item UNION ALL SELECT 'user', 0, count(*) FROM \"user\""
+    )
+
+
+def downgrade():
+    for trigger, table in [
+        ('item_count_insert', 'item'),
+        ('item_count_delete', 'item'),
+        ('item_count_update', 'item'),
+        ('user_count_insert', '"user"'),
+        ('user_count_delete', '"user"'),
+    ]:
+        op.execute(f'DROP TRIGGER {trigger} ON {table}')
+        op.execute(f'DROP FUNCTION {trigger}()')
+    op.execute('DROP FUNCTION add_table_count(text, bigint)')
+    op.drop_table('tablecount')
+    op.drop_table('itemcount')
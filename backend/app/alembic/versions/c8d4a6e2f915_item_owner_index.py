@@ -0,0 +1,30 @@
+"""Index item on owner_id, id
+
+Revision ID: c8d4a6e2f915
+Revises: b5e1f0c3a872
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8d4a6e2f915'
+down_revision = 'b5e1f0c3a872'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY does not block the writes to item while the index is built, but cannot run in a transaction
+    with op.get_context().autocommit_block():
+        # Left invalid by an interrupted build
+        op.drop_index('ix_item_owner_id_id', table_name='item', postgresql_concurrently=True, if_exists=True)
+        op.create_index(
+            'ix_item_owner_id_id', 'item', ['owner_id', 'id'], postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_item_owner_id_id', table_name='item', postgresql_concurrently=True)
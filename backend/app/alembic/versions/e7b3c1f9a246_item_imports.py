@@ -0,0 +1,36 @@
+"""Progress of the item imports
+
+Revision ID: e7b3c1f9a246
+Revises: c8d4a6e2f915
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3c1f9a246'
+down_revision = 'c8d4a6e2f915'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('itemimport',
+        sa.Column('read', sa.Integer(), nullable=False),
+        sa.Column('imported', sa.Integer(), nullable=False),
+        sa.Column('error_count', sa.Integer(), nullable=False),
+        sa.Column('complete', sa.Boolean(), nullable=False),
+        sa.Column('detail', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('owner_id', sa.Uuid(), nullable=False),
+        sa.Column('update_time', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade():
+    op.drop_table('itemimport')
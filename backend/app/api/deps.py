@@ -1,44 +1,73 @@
-from collections.abc import Generator
-from typing import Annotated
+from collections.abc import AsyncGenerator, Generator
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, Literal
 
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core import security
 from app.core.config import settings
-from app.core.db import engine
+from app.core.db import RequestSession, async_engine, engine
+from app.core.user_cache import user_cache
 from stack_datamodel import TokenPayload, User
+from stack_shared_tasks.metrics import DB_SESSIONS, DB_SESSIONS_UNUSED
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
 )
 
 
-def get_db() -> Generator[Session, None, None]:
-    with Session(engine) as session:
-        yield session
+def record_session_use(request: Request, session: Session) -> None:
+    route = getattr(request.scope.get("route"), "path", "")
+    DB_SESSIONS.labels(route=route).inc()
+    if not session.info.get("used"):
+        DB_SESSIONS_UNUSED.labels(route=route).inc()
+
+
+def get_db(request: Request) -> Generator[Session, None, None]:
+    # No connection is checked out until the session is used
+    session = RequestSession(engine)
+    try:
+        with session:
+            yield session
+    finally:
+        record_session_use(request, session)
+
+
+async def get_async_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    # Objects stay readable after a commit: expired attributes would need I/O to be loaded again
+    session = AsyncSession(async_engine, expire_on_commit=False, sync_session_class=RequestSession)
+    try:
+        async with session:
+            yield session
+    finally:
+        record_session_use(request, session.sync_session)
 
 
 SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
+def decode_token(token: str) -> TokenPayload:
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
         )
-        token_data = TokenPayload(**payload)
+        return TokenPayload(**payload)
     except (InvalidTokenError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = session.get(User, token_data.sub)
+
+
+def check_user(user: User | None) -> User:
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
@@ -46,7 +75,36 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
     return user
 
 
+def get_current_user(session: SessionDep, token: TokenDep) -> User:
+    token_data = decode_token(token)
+    user = user_cache.get(token_data.sub)
+    if user is None:
+        generation = user_cache.generation
+        user = session.get(User, token_data.sub)
+        if user:
+            user_cache.put(user, generation)
+    user = check_user(user)
+    # Return the connection to the pool now rather than at the end of the request (e.g. after waiting for a task):
+    # the user is detached, routes adding it to the session check out a connection again
+    session.close()
+    return user
+
+
+async def get_current_user_async(session: AsyncSessionDep, token: TokenDep) -> User:
+    token_data = decode_token(token)
+    user = user_cache.get(token_data.sub)
+    if user is None:
+        generation = user_cache.generation
+        user = await session.get(User, token_data.sub)
+        if user:
+            user_cache.put(user, generation)
+    user = check_user(user)
+    await session.close()
+    return user
+
+
 CurrentUser = Annotated[User, Depends(get_current_user)]
+AsyncCurrentUser = Annotated[User, Depends(get_current_user_async)]
 
 
 def get_current_active_superuser(current_user: CurrentUser) -> User:
@@ -55,3 +113,32 @@ def get_current_active_superuser(current_user: CurrentUser) -> User:
             status_code=403, detail="The user doesn't have enough privileges"
         )
     return current_user
+
+
+async def get_current_active_superuser_async(current_user: AsyncCurrentUser) -> User:
+    return get_current_active_superuser(current_user)
+
+
+def get_task_deadline(
+    x_request_timeout: Annotated[float | None, Header(gt=0)] = None
+) -> datetime:
+    """
+    Absolute deadline of the tasks submitted by the request.
+    """
+    timeout = settings.TASKS_DEFAULT_TIMEOUT_SECONDS
+    if x_request_timeout is not None:
+        timeout = min(x_request_timeout, settings.TASKS_MAX_TIMEOUT_SECONDS)
+    return datetime.now(timezone.utc) + timedelta(seconds=timeout)
+
+
+TaskDeadlineDep = Annotated[datetime, Depends(get_task_deadline)]
+
+# Optional key (e.g. a dataset or user id) routing related tasks to the same workers
+AffinityKeyDep = Annotated[str | None, Query(max_length=255)]
+
+# Traffic lane of the submitted tasks, by default interactive for the *-wait routes and bulk for the others
+TaskLane = Literal["interactive", "bulk"]
+TaskLaneDep = Annotated[TaskLane | None, Query()]
+
+# Set to profile the tasks submitted by the request, their profile is read on /tasks/{X-Task-Id}/profile
+TaskProfileDep = Annotated[bool, Header()]
@@ -0,0 +1,54 @@
+import base64
+import binascii
+import uuid
+from collections.abc import Sequence
+from typing import Annotated, Any, TypeVar
+
+from fastapi import HTTPException, Query
+from sqlmodel.sql.expression import SelectOfScalar
+
+from app.crud import CountMode
+
+T = TypeVar("T")
+
+# Opaque position in a listing, returned as ``next_cursor`` by the previous page
+CursorDep = Annotated[str | None, Query(max_length=64)]
+# How the total of a listing is counted: exact (default), estimate or none
+CountDep = Annotated[CountMode, Query(alias="count")]
+
+
+def encode_cursor(last_id: uuid.UUID) -> str:
+    return base64.urlsafe_b64encode(last_id.bytes).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> uuid.UUID:
+    try:
+        return uuid.UUID(bytes=base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(
+    statement: SelectOfScalar[T], id_column: Any, skip: int, cursor: str | None, limit: int
+) -> SelectOfScalar[T]:
+    """
+    Page of a listing ordered by ``id_column``, starting after ``cursor`` (keyset pagination: deep pages cost the
+    same as the first one given an index ending with the id) or at ``skip`` (offset pagination, kept for
+    compatibility). One extra row is fetched to tell whether there is a next page.
+    """
+    if cursor is not None and skip:
+        raise HTTPException(status_code=400, detail="Use either skip or cursor")
+    statement = statement.order_by(id_column).limit(limit + 1)
+    if cursor is not None:
+        return statement.where(id_column > decode_cursor(cursor))
+    return statement.offset(skip)
+
+
+def page_rows(rows: Sequence[T], limit: int) -> tuple[Sequence[T], str | None]:
+    """
+    Rows of the page and the cursor of the next one (``None`` on the last page).
+    """
+    if len(rows) <= limit or limit <= 0:
+        return rows[:max(limit, 0)], None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].id)
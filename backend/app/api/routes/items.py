@@ -1,52 +1,360 @@
+import codecs
+import csv
+import io
+import json
+import logging
 import uuid
-from typing import Any
+from collections.abc import AsyncIterator
+from datetime import datetime
+from typing import Annotated, Any, Literal, TypeVar
 
-from fastapi import APIRouter, HTTPException
-from sqlmodel import func, select
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+import psycopg
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlmodel import SQLModel, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.requests import ClientDisconnect
 
-from app.api.deps import CurrentUser, SessionDep
-from stack_datamodel import Item, ItemCreate, ItemPublic, ItemsPublic, ItemUpdate, Message
+from app import crud_async
+from app.api.deps import AsyncCurrentUser, AsyncSessionDep
+from app.api.pagination import CountDep, CursorDep, page_rows, paginate
+from app.core.db import async_engine
+from stack_datamodel import (
+    BulkError,
+    Item,
+    ItemBulkUpdate,
+    ItemCreate,
+    ItemImport,
+    ItemImportPublic,
+    ItemPublic,
+    ItemsBulkCreate,
+    ItemsBulkDelete,
+    ItemsBulkResult,
+    ItemsBulkUpdate,
+    ItemsImportResult,
+    ItemsPublic,
+    ItemUpdate,
+    Message,
+)
+from stack_shared_tasks.metrics import ITEMS_IMPORT_ROWS
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/items", tags=["items"])
 
+M = TypeVar("M", bound=SQLModel)
+
+# Rows fetched from the server-side cursor at a time by the exports
+EXPORT_BATCH = 1000
+EXPORT_COLUMNS = (Item.id, Item.title, Item.description, Item.owner_id)
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# Rows validated and copied at a time by the imports, and errors listed in their result
+IMPORT_BATCH = 10_000
+IMPORT_MAX_ERRORS = 1000
+
+
+def validate_rows(
+    rows: list[Any], model: type[M], start: int = 0
+) -> tuple[list[tuple[int, M]], list[BulkError]]:
+    """
+    Valid rows with their index in the request (the first row being at ``start``), and the errors of the invalid ones.
+    """
+    valid, errors = [], []
+    for index, row in enumerate(rows, start):
+        if isinstance(row, BulkError):
+            errors.append(BulkError(index=index, detail=row.detail))
+            continue
+        try:
+            valid.append((index, model.model_validate(row)))
+        except ValidationError as e:
+            errors.append(BulkError(index=index, detail=jsonable_encoder(e.errors(include_url=False))))
+    return valid, errors
+
 
 @router.get("/", response_model=ItemsPublic)
-def read_items(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+async def read_items(
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: CursorDep = None,
+    count_mode: CountDep = "exact",
 ) -> Any:
     """
-    Retrieve items.
+    Retrieve items, ordered by id. Pass the ``next_cursor`` of a page as ``cursor`` to get the next one.
     """
 
     if current_user.is_superuser:
-        count_statement = select(func.count()).select_from(Item)
-        count = session.exec(count_statement).one()
-        statement = select(Item).offset(skip).limit(limit)
-        items = session.exec(statement).all()
+        count = await crud_async.count_table(session=session, table_name="item", mode=count_mode)
+        statement = paginate(select(Item), Item.id, skip, cursor, limit)
+        items = (await session.exec(statement)).all()
     else:
-        count_statement = (
-            select(func.count())
-            .select_from(Item)
-            .where(Item.owner_id == current_user.id)
+        count = await crud_async.count_owner_items(session=session, owner_id=current_user.id, mode=count_mode)
+        statement = paginate(
+            select(Item).where(Item.owner_id == current_user.id), Item.id, skip, cursor, limit
+        )
+        items = (await session.exec(statement)).all()
+
+    items, next_cursor = page_rows(items, limit)
+    return ItemsPublic(data=items, count=count, next_cursor=next_cursor)
+
+
+async def export_lines(owner_id: uuid.UUID | None, export_format: Literal["ndjson", "csv"]) -> AsyncIterator[str]:
+    """
+    The items ordered by id, read from a server-side cursor ``EXPORT_BATCH`` rows at a time so that the memory used
+    does not depend on the number of items. The session is opened here: the one of the request is closed before the
+    body is sent.
+
+    The status of the response is sent with the first batch: an NDJSON export that fails ends with a
+    ``{"detail": ...}`` line, a CSV export is cut short.
+    """
+    statement = select(*EXPORT_COLUMNS).order_by(Item.id).execution_options(yield_per=EXPORT_BATCH)
+    if owner_id is not None:
+        statement = statement.where(Item.owner_id == owner_id)
+    names = [column.key for column in EXPORT_COLUMNS]
+    if export_format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(names)
+        yield buffer.getvalue()
+    try:
+        async with AsyncSession(async_engine) as session:
+            result = await session.stream(statement)
+            async for rows in result.partitions():
+                buffer = io.StringIO()
+                if export_format == "csv":
+                    csv.writer(buffer).writerows(rows)
+                else:
+                    for row in rows:
+                        buffer.write(json.dumps(dict(zip(names, row)), default=str) + "\n")
+                yield buffer.getvalue()
+    except SQLAlchemyError as e:
+        if export_format == "csv":
+            raise
+        yield json.dumps({"detail": f"The export failed: {e!r}"}) + "\n"
+
+
+async def body_lines(request: Request) -> AsyncIterator[str]:
+    """
+    The lines of the body of the request, decoded as they are received.
+    """
+    # utf-8-sig drops the byte order mark some editors write at the start of CSV files
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in request.stream():
+        *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def import_rows(request: Request, import_format: Literal["ndjson", "csv"]) -> AsyncIterator[Any]:
+    """
+    The rows of an NDJSON or CSV (with a header line) upload, or a ``BulkError`` for a row that cannot be parsed.
+    Empty CSV cells are ``None``.
+    """
+    names = None
+    record = ""
+    async for line in body_lines(request):
+        line = line.removesuffix("\r")
+        if import_format == "ndjson":
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield BulkError(index=0, detail="Invalid JSON")
+            continue
+        # A CSV record goes on until its quotes are balanced: quoted cells may contain newlines
+        record += line
+        if record.count('"') % 2:
+            record += "\n"
+            continue
+        if record:
+            values = next(csv.reader([record]))
+            if names is None:
+                names = values
+            else:
+                yield {name: value or None for name, value in zip(names, values)}
+        record = ""
+    if record:
+        yield BulkError(index=0, detail="Unterminated quoted cell")
+
+
+# Declared before the /{id} routes, which would match "export" and "bulk"
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()}}},
+)
+async def export_items(
+    current_user: AsyncCurrentUser,
+    export_format: Annotated[Literal["ndjson", "csv"], Query(alias="format")] = "ndjson",
+) -> StreamingResponse:
+    """
+    Stream all the items, ordered by id, as NDJSON (one item per line) or CSV (with a header line).
+    """
+    return StreamingResponse(
+        export_lines(None if current_user.is_superuser else current_user.id, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="items.{export_format}"'},
+    )
+
+
+@router.post("/import", response_model=ItemsImportResult)
+async def import_items(
+    *,
+    request: Request,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    import_format: Annotated[Literal["ndjson", "csv"], Query(alias="format")] = "ndjson",
+    import_id: uuid.UUID | None = None,
+) -> Any:
+    """
+    Import items from the body of the request, NDJSON (one item per line) or CSV (with a header line, extra columns
+    such as the ``id`` of an export are ignored). The body is parsed as it is received and the rows are validated
+    and loaded with ``COPY`` ``IMPORT_BATCH`` at a time, each batch in its own transaction. Invalid rows are skipped
+    and reported in ``errors`` (the first ``IMPORT_MAX_ERRORS`` of them).
+
+    The progress is committed with each batch: pass an ``import_id`` (a new UUID) to follow it with
+    ``GET /items/import/{import_id}`` while the body is sent, or to know what was imported when the upload was
+    interrupted. An import that stops early is not complete and its ``detail`` tells why.
+    """
+    import_id = import_id or uuid.uuid4()
+    session.add(ItemImport(id=import_id, owner_id=current_user.id))
+    try:
+        await session.commit()
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="An import with this id already exists")
+    result = ItemsImportResult(id=import_id, errors=[])
+
+    async def save_progress(**values: Any) -> None:
+        await session.execute(
+            update(ItemImport).where(ItemImport.id == import_id).values(**values, update_time=datetime.now())
         )
-        count = session.exec(count_statement).one()
-        statement = (
-            select(Item)
-            .where(Item.owner_id == current_user.id)
-            .offset(skip)
-            .limit(limit)
+        await session.commit()
+
+    async def load(rows: list[Any]) -> None:
+        valid, batch_errors = validate_rows(rows, ItemCreate, start=result.read)
+        copied = await crud_async.copy_items(
+            session=session, items_in=[item_in for _, item_in in valid], owner_id=current_user.id
         )
-        items = session.exec(statement).all()
+        read = result.read + len(rows)
+        imported = result.imported + copied
+        error_count = result.error_count + len(batch_errors)
+        # The batch is committed with the progress: the locks of the item counters are not held while the rest of
+        # the body is received, and the connection goes back to the pool
+        await save_progress(read=read, imported=imported, error_count=error_count)
+        result.read, result.imported, result.error_count = read, imported, error_count
+        result.errors.extend(batch_errors[:IMPORT_MAX_ERRORS - len(result.errors)])
+        ITEMS_IMPORT_ROWS.labels(outcome="imported").inc(len(valid))
+        ITEMS_IMPORT_ROWS.labels(outcome="rejected").inc(len(batch_errors))
+        logger.info("Import %s of %s: %d rows read, %d imported", import_id, current_user.id, read, imported)
 
-    return ItemsPublic(data=items, count=count)
+    rows = []
+    try:
+        async for row in import_rows(request, import_format):
+            rows.append(row)
+            if len(rows) == IMPORT_BATCH:
+                await load(rows)
+                rows = []
+        if rows:
+            await load(rows)
+        result.complete = True
+    except ClientDisconnect:
+        await session.rollback()
+        result.detail = f"The upload was interrupted after {result.read} rows"
+    except (SQLAlchemyError, psycopg.Error) as e:
+        await session.rollback()
+        logger.exception("Import %s of %s failed after %d rows", import_id, current_user.id, result.read)
+        result.detail = f"The import stopped after {result.read} rows: {e!r}"
+    await save_progress(complete=result.complete, detail=result.detail)
+    return result
+
+
+@router.get("/import/{import_id}", response_model=ItemImportPublic)
+async def read_import(session: AsyncSessionDep, current_user: AsyncCurrentUser, import_id: uuid.UUID) -> Any:
+    """
+    Get the progress of an import, committed with each of its batches.
+    """
+    item_import = await session.get(ItemImport, import_id)
+    if not item_import or (not current_user.is_superuser and item_import.owner_id != current_user.id):
+        raise HTTPException(status_code=404, detail="Import not found")
+    return item_import
+
+
+@router.post("/bulk", response_model=ItemsBulkResult)
+async def create_items(
+    *, session: AsyncSessionDep, current_user: AsyncCurrentUser, items_in: ItemsBulkCreate
+) -> Any:
+    """
+    Create items in bulk. Invalid rows are reported in ``errors`` and the others are created.
+    """
+    valid, errors = validate_rows(items_in.data, ItemCreate)
+    items = []
+    if valid:
+        items = await crud_async.create_items(
+            session=session, items_in=[item_in for _, item_in in valid], owner_id=current_user.id
+        )
+    return ItemsBulkResult(data=items, errors=errors)
+
+
+@router.patch("/bulk", response_model=ItemsBulkResult)
+async def update_items(
+    *, session: AsyncSessionDep, current_user: AsyncCurrentUser, items_in: ItemsBulkUpdate
+) -> Any:
+    """
+    Update items in bulk, only the fields given in each row. Invalid rows and items that were not found (or not
+    owned by the user) are reported in ``errors`` and the others are updated.
+    """
+    valid, errors = validate_rows(items_in.data, ItemBulkUpdate)
+    indexes: dict[uuid.UUID, int] = {}
+    for index, item_in in valid:
+        if item_in.id in indexes:
+            errors.append(BulkError(index=index, detail="Duplicate id"))
+        else:
+            indexes[item_in.id] = index
+    items = []
+    if indexes:
+        items = await crud_async.update_items(
+            session=session,
+            items_in=[item_in for index, item_in in valid if indexes.get(item_in.id) == index],
+            owner_id=None if current_user.is_superuser else current_user.id,
+        )
+    updated = {item.id for item in items}
+    errors.extend(BulkError(index=index, detail="Item not found") for id, index in indexes.items() if id not in updated)
+    errors.sort(key=lambda error: error.index)
+    return ItemsBulkResult(data=items, errors=errors)
+
+
+@router.delete("/bulk", response_model=ItemsBulkResult)
+async def delete_items(
+    *, session: AsyncSessionDep, current_user: AsyncCurrentUser, items_in: ItemsBulkDelete
+) -> Any:
+    """
+    Delete items in bulk. Items that were not found (or not owned by the user) are reported in ``errors``.
+    """
+    items = await crud_async.delete_items(
+        session=session,
+        ids=items_in.ids,
+        owner_id=None if current_user.is_superuser else current_user.id,
+    )
+    deleted = {item.id for item in items}
+    errors = [
+        BulkError(index=index, detail="Item not found") for index, id in enumerate(items_in.ids) if id not in deleted
+    ]
+    return ItemsBulkResult(data=items, errors=errors)
 
 
 @router.get("/{id}", response_model=ItemPublic)
-def read_item(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
+async def read_item(session: AsyncSessionDep, current_user: AsyncCurrentUser, id: uuid.UUID) -> Any:
     """
     Get item by ID.
     """
-    item = session.get(Item, id)
+    item = await session.get(Item, id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     if not current_user.is_superuser and (item.owner_id != current_user.id):
@@ -55,31 +363,27 @@ def read_item(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) ->
 
 
 @router.post("/", response_model=ItemPublic)
-def create_item(
-    *, session: SessionDep, current_user: CurrentUser, item_in: ItemCreate
+async def create_item(
+    *, session: AsyncSessionDep, current_user: AsyncCurrentUser, item_in: ItemCreate
 ) -> Any:
     """
     Create new item.
     """
-    item = Item.model_validate(item_in, update={"owner_id": current_user.id})
-    session.add(item)
-    session.commit()
-    session.refresh(item)
-    return item
+    return await crud_async.create_item(session=session, item_in=item_in, owner_id=current_user.id)
 
 
 @router.put("/{id}", response_model=ItemPublic)
-def update_item(
+async def update_item(
     *,
-    session: SessionDep,
-    current_user: CurrentUser,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
     id: uuid.UUID,
     item_in: ItemUpdate,
 ) -> Any:
     """
     Update an item.
     """
-    item = session.get(Item, id)
+    item = await session.get(Item, id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     if not current_user.is_superuser and (item.owner_id != current_user.id):
@@ -87,23 +391,23 @@ def update_item(
     update_dict = item_in.model_dump(exclude_unset=True)
     item.sqlmodel_update(update_dict)
     session.add(item)
-    session.commit()
-    session.refresh(item)
+    await session.commit()
+    await session.refresh(item)
     return item
 
 
 @router.delete("/{id}")
-def delete_item(
-    session: SessionDep, current_user: CurrentUser, id: uuid.UUID
+async def delete_item(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser, id: uuid.UUID
 ) -> Message:
     """
     Delete an item.
     """
-    item = session.get(Item, id)
+    item = await session.get(Item, id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     if not current_user.is_superuser and (item.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    session.delete(item)
-    session.commit()
+    await session.delete(item)
+    await session.commit()
     return Message(message="Item deleted successfully")
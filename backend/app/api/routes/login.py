@@ -6,11 +6,16 @@ from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import HTMLResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
-from app import crud
-from app.api.deps import CurrentUser, SessionDep, get_current_active_superuser
+from app import crud, crud_async
+from app.api.deps import (
+    AsyncCurrentUser,
+    AsyncSessionDep,
+    SessionDep,
+    get_current_active_superuser,
+)
 from app.core import security
 from app.core.config import settings
-from app.core.security import get_password_hash
+from app.core.security import password_hasher
 from stack_datamodel import Message, NewPassword, Token, UserPublic, UserCreateEmailPassword
 from app.utils import (
     generate_verification_token,
@@ -36,13 +41,13 @@ def generate_access_token(
 
 
 @router.post("/login/access-token")
-def login_access_token(
-    session: SessionDep, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
+async def login_access_token(
+    session: AsyncSessionDep, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
 ) -> Token:
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = crud.authenticate(
+    user = await crud_async.authenticate(
         session=session, email=form_data.username, password=form_data.password
     )
     if not user:
@@ -53,7 +58,7 @@ def login_access_token(
 
 
 @router.post("/login/test-token", response_model=UserPublic)
-def test_token(current_user: CurrentUser) -> Any:
+async def test_token(current_user: AsyncCurrentUser) -> Any:
     """
     Test access token
     """
@@ -101,7 +106,7 @@ def reset_password(session: SessionDep, body: NewPassword) -> Message:
         )
     elif not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-    hashed_password = get_password_hash(password=body.new_password)
+    hashed_password = password_hasher.hash(body.new_password)
     user.hashed_password = hashed_password
     session.add(user)
     session.commit()
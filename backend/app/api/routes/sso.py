@@ -7,8 +7,8 @@ from fastapi_sso import create_provider, OpenID
 from httpx import AsyncClient
 from starlette.responses import RedirectResponse
 
-from app import crud
-from app.api.deps import SessionDep
+from app import crud_async
+from app.api.deps import AsyncSessionDep
 from app.api.routes.login import generate_access_token
 from app.core.config import settings
 from stack_datamodel import Token, UserCreateEmailPassword
@@ -96,7 +96,7 @@ async def base_fusion_auth_login(
 
 
 async def base_fusionauth_callback(
-        session: SessionDep,
+        session: AsyncSessionDep,
         request: Request,
         fusionauth_client_id: str,
         fusionauth_client_secret_app: str,
@@ -115,7 +115,7 @@ async def base_fusionauth_callback(
         raise HTTPException(401, "Failed to fetch email information")
 
     # Create user if missing
-    db_user = crud.get_user_by_email(session=session, email=user.email)
+    db_user = await crud_async.get_user_by_email(session=session, email=user.email)
     if not db_user:
         user_create = UserCreateEmailPassword(
             email=user.email,
@@ -123,8 +123,8 @@ async def base_fusionauth_callback(
             sso_openid=user.id,
             password=secrets.token_urlsafe(32)  # A random unknown password is set
         )
-        db_user = crud.create_user_email_and_password(session=session, user_create=user_create)
-        crud.activate_user(session=session, db_user=db_user)
+        db_user = await crud_async.create_user_email_and_password(session=session, user_create=user_create)
+        await crud_async.activate_user(session=session, db_user=db_user)
     return generate_access_token(db_user.id)
 
 
@@ -164,7 +164,7 @@ async def fusionauth_login_html_app_a(
 
 @router.get("/fusionauth/app-a/callback")
 async def fusionauth_callback_app_a(
-        session: SessionDep,
+        session: AsyncSessionDep,
         request: Request,
         # We can't use the following "depends" because we need to create the instance in a with so that the pkce code
         # is created properly.
@@ -180,7 +180,7 @@ async def fusionauth_callback_app_a(
 
 @router.get("/fusionauth/app-a/callback-html")
 async def fusionauth_callback_html_app_a(
-        session: SessionDep,
+        session: AsyncSessionDep,
         request: Request,
 ) -> HTMLResponse:
     access_token = await base_fusionauth_callback(
@@ -228,7 +228,7 @@ async def fusionauth_login_html_app_b(
 
 @router.get("/fusionauth/app-b/callback")
 async def fusionauth_callback_app_b(
-        session: SessionDep,
+        session: AsyncSessionDep,
         request: Request,
         # We can't use the following "depends" because we need to create the instance in a with so that the pkce code
         # is created properly.
@@ -244,7 +244,7 @@ async def fusionauth_callback_app_b(
 
 @router.get("/fusionauth/app-b/callback-html")
 async def fusionauth_callback_html_app_b(
-        session: SessionDep,
+        session: AsyncSessionDep,
         request: Request,
 ) -> HTMLResponse:
     access_token = await base_fusionauth_callback(
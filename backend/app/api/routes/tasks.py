@@ -1,38 +1,186 @@
-from fastapi import APIRouter, Depends
+import json
+import math
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Iterator
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlmodel import Session
 
 from app.api.deps import (
-    SessionDep,
+    AffinityKeyDep,
+    AsyncCurrentUser,
+    CurrentUser,
+    TaskDeadlineDep,
+    TaskLane,
+    TaskLaneDep,
+    TaskProfileDep,
     get_current_active_superuser,
+    get_current_active_superuser_async,
 )
+from app.core.broker import AsyncTaskPublisher, BrokerUnavailableError, CircuitBreaker
 from app.core.config import settings, celery_config
 
 from celery import Celery, signature, chain
+from celery.exceptions import SoftTimeLimitExceeded, TaskRevokedError, TimeLimitExceeded, TimeoutError
+from celery.result import AsyncResult
+from celery.utils import uuid
 
-from stack_datamodel import Message
+from stack_datamodel import Message, TaskProfile, User
 from stack_datamodel.tasks import (
     BinaryOperandsPayloadSchema,
     BinaryOperationResultSchema,
     SampleBaseRandomVariablePayloadSchema,
     SampleResultSchema,
+    SampleStreamPayloadSchema,
     BinaryIntegerOperandsPayloadSchema
 )
+from stack_shared_tasks.deadlines import deadline_options, seconds_until
+from stack_shared_tasks.fairshare import LANES, FairShare, fair_share_options, lane_priority
+from stack_shared_tasks.hedging import Hedger
+from stack_shared_tasks.app import configure_app
+from stack_shared_tasks.backends import PooledDatabaseBackend, backend_url
+from stack_shared_tasks.profiling import profile_options
+from stack_shared_tasks.routing import affinity_options
+from stack_shared_tasks.streaming import stream_chunks
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
 task_queue = Celery(
     settings.PROJECT_NAME,
     broker=str(settings.RABBITMQ_URI),
-    backend=str(settings.CELERY_BACKEND_DB_URI),
+    backend=backend_url(settings.CELERY_BACKEND_DB_URI, PooledDatabaseBackend),
 )
 task_queue.config_from_object(celery_config)
+configure_app(task_queue, celery_config)
+publisher = AsyncTaskPublisher(
+    task_queue,
+    str(settings.RABBITMQ_URI),
+    timeout=settings.TASKS_PUBLISH_TIMEOUT_SECONDS,
+    breaker=CircuitBreaker(
+        failure_threshold=settings.TASKS_PUBLISH_BREAKER_FAILURES,
+        reset_timeout=settings.TASKS_PUBLISH_BREAKER_RESET_SECONDS,
+    ),
+)
+hedger = Hedger(
+    percentile=settings.TASKS_HEDGING_PERCENTILE,
+    min_delay=settings.TASKS_HEDGING_MIN_DELAY_SECONDS,
+    min_samples=settings.TASKS_HEDGING_MIN_SAMPLES,
+    budget_ratio=settings.TASKS_HEDGING_BUDGET_RATIO,
+)
+# The priorities are split in one band per lane
+fair_share_levels = (celery_config.task_queue_max_priority + 1) // len(LANES)
+scheduler = FairShare(
+    rate=settings.TASKS_FAIR_SHARE_RATE,
+    burst=settings.TASKS_FAIR_SHARE_BURST,
+    levels=fair_share_levels,
+)
+
+
+def fair_share(user: User, lane: TaskLane, cost: int = 1) -> dict:
+    """
+    Charge ``cost`` tasks to the user and return the tenant and priority options of its submission in ``lane``.
+    """
+    tenant = str(user.id)
+    return fair_share_options(tenant, lane_priority(lane, scheduler.priority(tenant, cost), fair_share_levels))
+
+
+def task_options(
+        deadline: datetime,
+        share: dict,
+        affinity_key: str | None = None,
+        profile: bool = False,
+) -> dict:
+    """
+    Options of the tasks submitted by a request.
+    """
+    options = {**deadline_options(deadline), **share}
+    headers = {**share['headers'], **affinity_options(affinity_key).get('headers', {})}
+    if profile:
+        headers.update(profile_options()['headers'])
+    options['headers'] = headers
+    return options
+
+
+@contextmanager
+def deadline_exceeded_as_504() -> Iterator[None]:
+    try:
+        yield
+    except (TimeoutError, SoftTimeLimitExceeded, TimeLimitExceeded, TaskRevokedError):
+        raise HTTPException(status_code=504, detail="The task did not complete before the deadline")
+
+
+def wait_for_result(result: AsyncResult, deadline: datetime) -> Any:
+    """
+    Wait for the result of a task, giving up with 504 at the deadline.
+    """
+    timeout = seconds_until(deadline)
+    with deadline_exceeded_as_504():
+        if timeout <= 0:
+            raise TimeoutError()
+        return result.wait(timeout=timeout, interval=0.5)
+
+
+def send_and_wait(
+        task_name: str,
+        deadline: datetime,
+        share: dict,
+        affinity_key: str | None = None,
+        args: tuple = (),
+        kwargs: dict | None = None,
+        task_id: str | None = None,
+        profile: bool = False,
+) -> Any:
+    """
+    Send a task and wait for its result, hedging it when enabled for the task.
+
+    The duplicate is sent without affinity key: it goes to the logical queue of the task, where another
+    consumer than the one holding the late task can pick it up. ``task_id`` is the id of the first task sent.
+    """
+    options = task_options(deadline, share, affinity_key, profile)
+    if not (settings.TASKS_HEDGING_ENABLED and task_name in settings.TASKS_HEDGEABLE):
+        task = task_queue.send_task(task_name, args=args, kwargs=kwargs, task_id=task_id, **options)
+        return wait_for_result(task, deadline)
+    timeout = seconds_until(deadline)
+    with deadline_exceeded_as_504():
+        if timeout <= 0:
+            raise TimeoutError()
+        return hedger.run(
+            task_name,
+            lambda: task_queue.send_task(task_name, args=args, kwargs=kwargs, task_id=task_id, **options),
+            lambda: task_queue.send_task(
+                task_name, args=args, kwargs=kwargs, **task_options(deadline, share, profile=profile)
+            ),
+            timeout,
+        )
 
 
 @router.post(
     "/add",
-    dependencies=[Depends(get_current_active_superuser)],
+    dependencies=[Depends(get_current_active_superuser_async)],
     response_model=Message
 )
-def submit_task_add(session: SessionDep, payload: BinaryOperandsPayloadSchema) -> Message:
-    task_queue.send_task('add', args=(payload.a, payload.b))
+async def submit_task_add(
+        current_user: AsyncCurrentUser,
+        deadline: TaskDeadlineDep,
+        payload: BinaryOperandsPayloadSchema,
+        response: Response,
+        affinity_key: AffinityKeyDep = None,
+        lane: TaskLaneDep = None,
+        x_task_profile: TaskProfileDep = False
+) -> Message:
+    share = fair_share(current_user, lane or "bulk")
+    try:
+        task = await publisher.send_task(
+            'add', args=(payload.a, payload.b), **task_options(deadline, share, affinity_key, x_task_profile)
+        )
+    except BrokerUnavailableError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="The task queue is unavailable",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+    response.headers["X-Task-Id"] = task.id
     return Message(message="Task add submitted successfully")
 
 
@@ -41,10 +189,29 @@ def submit_task_add(session: SessionDep, payload: BinaryOperandsPayloadSchema) -
     dependencies=[Depends(get_current_active_superuser)],
     response_model=BinaryOperationResultSchema
 )
-def submit_task_add_wait(session: SessionDep, payload: BinaryOperandsPayloadSchema) -> BinaryOperationResultSchema:
+def submit_task_add_wait(
+        current_user: CurrentUser,
+        deadline: TaskDeadlineDep,
+        payload: BinaryOperandsPayloadSchema,
+        response: Response,
+        affinity_key: AffinityKeyDep = None,
+        lane: TaskLaneDep = None,
+        x_task_profile: TaskProfileDep = False
+) -> BinaryOperationResultSchema:
     task_name = 'add'
-    task = task_queue.send_task(task_name, args=(payload.a, payload.b))
-    result = BinaryOperationResultSchema(s=task.wait(timeout=None, interval=0.5))
+    share = fair_share(current_user, lane or "interactive")
+    task_id = response.headers["X-Task-Id"] = uuid()
+    result = BinaryOperationResultSchema(
+        s=send_and_wait(
+            task_name,
+            deadline,
+            share,
+            affinity_key,
+            args=(payload.a, payload.b),
+            task_id=task_id,
+            profile=x_task_profile,
+        )
+    )
     return result
 
 
@@ -53,10 +220,21 @@ def submit_task_add_wait(session: SessionDep, payload: BinaryOperandsPayloadSche
     dependencies=[Depends(get_current_active_superuser)],
     response_model=BinaryOperationResultSchema
 )
-def submit_task_multiply_wait(session: SessionDep, payload: BinaryOperandsPayloadSchema) -> BinaryOperationResultSchema:
+def submit_task_multiply_wait(
+        current_user: CurrentUser,
+        deadline: TaskDeadlineDep,
+        payload: BinaryOperandsPayloadSchema,
+        response: Response,
+        affinity_key: AffinityKeyDep = None,
+        lane: TaskLaneDep = None,
+        x_task_profile: TaskProfileDep = False
+) -> BinaryOperationResultSchema:
     task_name = 'multiply'
-    task = task_queue.send_task(task_name, kwargs=payload.model_dump())
-    result = task.wait(timeout=None, interval=0.5)
+    share = fair_share(current_user, lane or "interactive")
+    task_id = response.headers["X-Task-Id"] = uuid()
+    result = send_and_wait(
+        task_name, deadline, share, affinity_key, kwargs=payload.model_dump(), task_id=task_id, profile=x_task_profile
+    )
     return result
 
 
@@ -66,25 +244,43 @@ def submit_task_multiply_wait(session: SessionDep, payload: BinaryOperandsPayloa
     response_model=BinaryOperationResultSchema
 )
 def submit_task_multiply_by_summation_wait(
-        session: SessionDep,
-        payload: BinaryIntegerOperandsPayloadSchema
+        current_user: CurrentUser,
+        deadline: TaskDeadlineDep,
+        payload: BinaryIntegerOperandsPayloadSchema,
+        response: Response,
+        affinity_key: AffinityKeyDep = None,
+        lane: TaskLaneDep = None,
+        x_task_profile: TaskProfileDep = False
 ) -> BinaryOperationResultSchema:
     if payload.b == 0:
         return BinaryOperationResultSchema(s=0)
     if payload.b == 1:
         return BinaryOperationResultSchema(s=payload.a)
+    # The whole chain is charged to the user: a long chain lowers the priority of all its links
+    share = fair_share(current_user, lane or "interactive", cost=payload.b - 1)
+    # Options given to chain.apply_async only reach the first link: every link carries its own deadline
     job = chain(
         *(
-                [task_queue.signature('add', args=(payload.a, payload.a))] +
                 [
-                    task_queue.signature('add', args=(payload.a,))
+                    task_queue.signature(
+                        'add',
+                        args=(payload.a, payload.a),
+                        **task_options(deadline, share, affinity_key, x_task_profile)
+                    )
+                ] +
+                [
+                    task_queue.signature(
+                        'add', args=(payload.a,), **task_options(deadline, share, affinity_key, x_task_profile)
+                    )
                     for _ in range(payload.b - 2)
                 ]
         )
     )
     result = job.apply_async()
+    # The result of the chain is the one of its last link, which also holds the profile of the links fused into it
+    response.headers["X-Task-Id"] = result.id
     result = BinaryOperationResultSchema(
-        s=result.get()
+        s=wait_for_result(result, deadline)
     )
     return result
 
@@ -95,10 +291,82 @@ def submit_task_multiply_by_summation_wait(
     response_model=SampleResultSchema
 )
 def submit_task_sample_normal_wait(
-        session: SessionDep,
-        payload: SampleBaseRandomVariablePayloadSchema
+        current_user: CurrentUser,
+        deadline: TaskDeadlineDep,
+        payload: SampleBaseRandomVariablePayloadSchema,
+        response: Response,
+        affinity_key: AffinityKeyDep = None,
+        lane: TaskLaneDep = None,
+        x_task_profile: TaskProfileDep = False
 ) -> SampleResultSchema:
     task_name = 'sample-normal'
-    task = task_queue.send_task(task_name, kwargs=payload.model_dump())
-    result = task.wait(timeout=None, interval=0.5)
+    share = fair_share(current_user, lane or "interactive")
+    task = task_queue.send_task(
+        task_name, kwargs=payload.model_dump(), **task_options(deadline, share, affinity_key, x_task_profile)
+    )
+    response.headers["X-Task-Id"] = task.id
+    result = wait_for_result(task, deadline)
     return result
+
+
+def ndjson_lines(task: AsyncResult, deadline: datetime) -> Iterator[str]:
+    """
+    The chunks of a streaming task, one JSON document per line.
+
+    The status of the response is sent with the first line: a failure or the deadline while streaming ends the
+    body with a ``{"detail": ...}`` line instead.
+    """
+    try:
+        for chunk in stream_chunks(task_queue, task.id, deadline):
+            yield chunk + "\n"
+    except (TimeoutError, SoftTimeLimitExceeded, TimeLimitExceeded, TaskRevokedError):
+        yield json.dumps({"detail": "The task did not complete before the deadline"}) + "\n"
+    except Exception as e:
+        yield json.dumps({"detail": f"The task failed: {e!r}"}) + "\n"
+
+
+@router.post(
+    "/sample-normal-stream",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+def submit_task_sample_normal_stream(
+        current_user: CurrentUser,
+        deadline: TaskDeadlineDep,
+        payload: SampleStreamPayloadSchema,
+        response: Response,
+        affinity_key: AffinityKeyDep = None,
+        lane: TaskLaneDep = None,
+        x_task_profile: TaskProfileDep = False
+) -> StreamingResponse:
+    """
+    Stream the samples as NDJSON, one array of samples per line, while the task produces them.
+    """
+    task_name = 'sample-normal-stream'
+    share = fair_share(current_user, lane or "interactive")
+    task = task_queue.send_task(
+        task_name, kwargs=payload.model_dump(), **task_options(deadline, share, affinity_key, x_task_profile)
+    )
+    return StreamingResponse(
+        ndjson_lines(task, deadline), media_type="application/x-ndjson", headers={"X-Task-Id": task.id}
+    )
+
+
+@router.get(
+    "/{task_id}/profile",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_class=PlainTextResponse,
+)
+def read_task_profile(task_id: str) -> PlainTextResponse:
+    """
+    Profile of a task as collapsed stacks (the input of flame graph tools), most sampled first.
+    """
+    with Session(task_queue.backend.engine) as session:
+        profile = session.get(TaskProfile, task_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(
+        profile.stacks,
+        headers={"X-Profile-Samples": str(profile.samples), "X-Profile-Duration": f"{profile.duration:.3f}"},
+    )
@@ -2,16 +2,18 @@ import uuid
 from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import col, delete, func, select
+from sqlmodel import col, delete, select
 
 from app import crud
 from app.api.deps import (
+    AsyncCurrentUser,
     CurrentUser,
     SessionDep,
     get_current_active_superuser,
 )
+from app.api.pagination import CountDep, CursorDep, page_rows, paginate
 from app.core.config import settings
-from app.core.security import get_password_hash, verify_password
+from app.core.security import password_hasher
 from stack_datamodel import (
     Item,
     Message,
@@ -36,18 +38,23 @@ router = APIRouter(prefix="/users", tags=["users"])
     dependencies=[Depends(get_current_active_superuser)],
     response_model=UsersPublic,
 )
-def read_users(session: SessionDep, skip: int = 0, limit: int = 100) -> Any:
+def read_users(
+    session: SessionDep,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: CursorDep = None,
+    count_mode: CountDep = "exact",
+) -> Any:
     """
-    Retrieve users.
+    Retrieve users, ordered by id. Pass the ``next_cursor`` of a page as ``cursor`` to get the next one.
     """
 
-    count_statement = select(func.count()).select_from(User)
-    count = session.exec(count_statement).one()
+    count = crud.count_table(session=session, table_name="user", mode=count_mode)
 
-    statement = select(User).offset(skip).limit(limit)
-    users = session.exec(statement).all()
+    statement = paginate(select(User), User.id, skip, cursor, limit)
+    users, next_cursor = page_rows(session.exec(statement).all(), limit)
 
-    return UsersPublic(data=users, count=count)
+    return UsersPublic(data=users, count=count, next_cursor=next_cursor)
 
 
 @router.post(
@@ -106,13 +113,13 @@ def update_password_me(
     """
     Update own password.
     """
-    if not verify_password(body.current_password, current_user.hashed_password):
+    if not password_hasher.verify(body.current_password, current_user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect password")
     if body.current_password == body.new_password:
         raise HTTPException(
             status_code=400, detail="New password cannot be the same as the current one"
         )
-    hashed_password = get_password_hash(body.new_password)
+    hashed_password = password_hasher.hash(body.new_password)
     current_user.hashed_password = hashed_password
     session.add(current_user)
     session.commit()
@@ -120,7 +127,7 @@ def update_password_me(
 
 
 @router.get("/me", response_model=UserPublic)
-def read_user_me(current_user: CurrentUser) -> Any:
+async def read_user_me(current_user: AsyncCurrentUser) -> Any:
     """
     Get current user.
     """
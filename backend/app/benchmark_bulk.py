@@ -0,0 +1,92 @@
+"""
+Compare the throughput of per-row and bulk writes of items, in rows per second.
+
+``--rows`` items are written like the routes do:
+
+- per row: ``POST /items/`` for each item, a transaction and three round trips per item
+- bulk: ``POST /items/bulk``, ``PATCH /items/bulk`` and ``DELETE /items/bulk`` in batches of ``--batch`` rows
+
+The items belong to a benchmark user, deleted at the end with its items.
+
+Example, from the backend container::
+
+    python -m app.benchmark_bulk --rows 10000 --batch 10000
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud_async
+from app.core.db import async_engine
+from app.core.security import get_password_hash
+from stack_datamodel import ItemBulkUpdate, ItemCreate, User
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BENCHMARK_EMAIL = "bulk-benchmark@example.com"
+
+
+async def get_benchmark_user(session: AsyncSession) -> User:
+    user = (await session.exec(select(User).where(User.email == BENCHMARK_EMAIL))).first()
+    if not user:
+        user = User(email=BENCHMARK_EMAIL, hashed_password=get_password_hash("bulk-benchmark"))
+        session.add(user)
+        await session.commit()
+        await session.refresh(user)
+    return user
+
+
+def log_rate(name: str, rows: int, start: float) -> None:
+    logger.info("%s: %.0f rows/s", name, rows / (time.perf_counter() - start))
+
+
+async def benchmark(rows: int, batch: int) -> None:
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        user = await get_benchmark_user(session)
+        items_in = [ItemCreate(title=f"item {n}") for n in range(rows)]
+
+        start = time.perf_counter()
+        for item_in in items_in:
+            await crud_async.create_item(session=session, item_in=item_in, owner_id=user.id)
+        log_rate("create per row", rows, start)
+
+        start = time.perf_counter()
+        items = []
+        for offset in range(0, rows, batch):
+            items.extend(await crud_async.create_items(
+                session=session, items_in=items_in[offset:offset + batch], owner_id=user.id
+            ))
+        log_rate("create bulk", rows, start)
+
+        updates = [ItemBulkUpdate(id=item.id, title=f"updated {item.title}") for item in items]
+        start = time.perf_counter()
+        for offset in range(0, rows, batch):
+            await crud_async.update_items(session=session, items_in=updates[offset:offset + batch], owner_id=user.id)
+        log_rate("update bulk", rows, start)
+
+        ids = [item.id for item in items]
+        start = time.perf_counter()
+        for offset in range(0, rows, batch):
+            await crud_async.delete_items(session=session, ids=ids[offset:offset + batch], owner_id=user.id)
+        log_rate("delete bulk", rows, start)
+
+        await session.delete(user)
+        await session.commit()
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--batch", type=int, default=10_000, help="Rows per bulk request (at most 10000)")
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.rows, args.batch))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Compare the throughput of the sync and async database stacks under concurrency.
+
+Each request does what ``GET /items/`` does (authenticate the user, count and list the items), ``--requests`` times
+with ``--concurrency`` requests in flight:
+
+- sync: a ``Session`` on ``engine`` in the threadpool, like the ``def`` routes (40 threads by default)
+- async: an ``AsyncSession`` on ``async_engine`` on the event loop, like the ``async def`` routes
+
+Example, from the backend container::
+
+    python -m app.benchmark_db --concurrency 200 --requests 5000
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+
+from sqlmodel import Session, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.db import async_engine, engine
+from stack_datamodel import Item, User
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def sync_request() -> None:
+    with Session(engine) as session:
+        user = session.exec(select(User).where(User.email == settings.FIRST_SUPERUSER)).one()
+        session.exec(select(func.count()).select_from(Item).where(Item.owner_id == user.id)).one()
+        session.exec(select(Item).where(Item.owner_id == user.id).limit(20)).all()
+
+
+async def async_request() -> None:
+    async with AsyncSession(async_engine) as session:
+        user = (await session.exec(select(User).where(User.email == settings.FIRST_SUPERUSER))).one()
+        (await session.exec(select(func.count()).select_from(Item).where(Item.owner_id == user.id))).one()
+        (await session.exec(select(Item).where(Item.owner_id == user.id).limit(20))).all()
+
+
+async def run(request: Callable[[], Awaitable[None]], requests: int, concurrency: int) -> tuple[float, list[float]]:
+    """
+    Requests per second and latencies of ``requests`` requests, ``concurrency`` at a time.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def timed() -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await request()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(timed() for _ in range(requests)))
+    return requests / (time.perf_counter() - start), latencies
+
+
+async def benchmark(requests: int, concurrency: int) -> None:
+    stacks = {
+        "sync": lambda: run_in_threadpool(sync_request),
+        "async": async_request,
+    }
+    for name, request in stacks.items():
+        # Warm up the pools
+        await run(request, concurrency, concurrency)
+        throughput, latencies = await run(request, requests, concurrency)
+        latencies.sort()
+        logger.info(
+            "%s: %.0f requests/s, p50 %.1f ms, p99 %.1f ms",
+            name,
+            throughput,
+            statistics.median(latencies) * 1000,
+            latencies[int(0.99 * (len(latencies) - 1))] * 1000,
+        )
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Measure the login throughput of a running API and the latency of the other requests during a login storm.
+
+``--logins`` logins of the first superuser are sent, ``--concurrency`` at a time, while ``--probes`` requests per
+second are sent to ``--probe-path`` (a cheap route that does not hash passwords). The latency of the probes is first
+measured without logins, as a baseline. Shed logins (``503``) are counted apart.
+
+Example, against the backend container::
+
+    python -m app.benchmark_login --url http://localhost:8000 --logins 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+import httpx
+
+from app.core.config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def percentile(latencies: list[float], q: float) -> float:
+    latencies = sorted(latencies)
+    return latencies[int(q * (len(latencies) - 1))] * 1000
+
+
+async def probe(client: httpx.AsyncClient, path: str, rate: float, stop: asyncio.Event) -> list[float]:
+    latencies: list[float] = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(max(0.0, 1 / rate - latencies[-1]))
+    return latencies
+
+
+async def login_storm(client: httpx.AsyncClient, logins: int, concurrency: int) -> tuple[float, dict[int, int]]:
+    """
+    Successful logins per second and count of the responses by status.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses: dict[int, int] = {}
+    data = {
+        "username": settings.FIRST_SUPERUSER,
+        "password": settings.FIRST_SUPERUSER_PASSWORD.get_secret_value(),
+    }
+
+    async def login() -> None:
+        async with semaphore:
+            response = await client.post(f"{settings.API_V1_STR}/login/access-token", data=data)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    return statuses.get(200, 0) / (time.perf_counter() - start), statuses
+
+
+async def benchmark(url: str, logins: int, concurrency: int, probe_path: str, probes: float, baseline: float) -> None:
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        stop = asyncio.Event()
+        probing = asyncio.create_task(probe(client, probe_path, probes, stop))
+        await asyncio.sleep(baseline)
+        stop.set()
+        latencies = await probing
+        logger.info(
+            "Probes without logins: p50 %.1f ms, p99 %.1f ms",
+            statistics.median(latencies) * 1000,
+            percentile(latencies, 0.99),
+        )
+
+        stop = asyncio.Event()
+        probing = asyncio.create_task(probe(client, probe_path, probes, stop))
+        throughput, statuses = await login_storm(client, logins, concurrency)
+        stop.set()
+        latencies = await probing
+        logger.info("Logins: %.1f/s, responses by status %s", throughput, statuses)
+        logger.info(
+            "Probes during the logins: p50 %.1f ms, p99 %.1f ms",
+            statistics.median(latencies) * 1000,
+            percentile(latencies, 0.99),
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--probe-path", default=f"{settings.API_V1_STR}/utils/health-check/")
+    parser.add_argument("--probes", type=float, default=20.0, help="Probe requests per second")
+    parser.add_argument("--baseline", type=float, default=5.0, help="Seconds of probes without logins")
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.url, args.logins, args.concurrency, args.probe_path, args.probes, args.baseline))
+
+
+if __name__ == "__main__":
+    main()
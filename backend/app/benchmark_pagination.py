@@ -0,0 +1,108 @@
+"""
+Compare offset and keyset (cursor) pagination of the items of a user at increasing depths.
+
+``--seed`` first inserts that many items owned by the benchmark user (``--cleanup`` deletes the user and its items
+at the end). Each page is read like ``GET /items/`` does, ``--repeat`` times:
+
+- offset: ``ORDER BY id OFFSET <depth> LIMIT <limit>``, the cost grows with the depth
+- keyset: ``WHERE id > <cursor> ORDER BY id LIMIT <limit>``, the cost does not depend on the depth
+
+Example, from the backend container::
+
+    python -m app.benchmark_pagination --seed 10000000 --depths 0 10000 1000000 9000000 --cleanup
+"""
+import argparse
+import logging
+import statistics
+import time
+from typing import Any
+
+from sqlalchemy import Select, text
+from sqlmodel import Session, delete, select
+
+from app.api.pagination import encode_cursor, paginate
+from app.core.db import engine
+from app.core.security import get_password_hash
+from stack_datamodel import Item, User
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BENCHMARK_EMAIL = "pagination-benchmark@example.com"
+SEED_BATCH = 1_000_000
+
+
+def get_benchmark_user(session: Session) -> User:
+    user = session.exec(select(User).where(User.email == BENCHMARK_EMAIL)).first()
+    if not user:
+        user = User(email=BENCHMARK_EMAIL, hashed_password=get_password_hash("pagination-benchmark"))
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+    return user
+
+
+def seed(session: Session, user: User, rows: int) -> None:
+    for start in range(0, rows, SEED_BATCH):
+        session.execute(
+            text(
+                "INSERT INTO item (id, title, owner_id) "
+                "SELECT gen_random_uuid(), 'item ' || n, :owner_id FROM generate_series(1, :rows) AS n"
+            ),
+            {"owner_id": user.id, "rows": min(SEED_BATCH, rows - start)},
+        )
+        session.commit()
+        logger.info("Seeded %d items", min(start + SEED_BATCH, rows))
+    session.execute(text("ANALYZE item"))
+    session.commit()
+
+
+def timed_page(session: Session, statement: Select[Any], repeat: int) -> float:
+    """
+    Median duration of the query, in milliseconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        session.exec(statement).all()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1000
+
+
+def benchmark(depths: list[int], limit: int, repeat: int, seed_rows: int, cleanup: bool) -> None:
+    with Session(engine) as session:
+        user = get_benchmark_user(session)
+        if seed_rows:
+            seed(session, user, seed_rows)
+        items = select(Item).where(Item.owner_id == user.id)
+        for depth in depths:
+            # Id of the last item before the page: what the cursor of the previous page holds
+            last_id = session.exec(
+                select(Item.id).where(Item.owner_id == user.id).order_by(Item.id).offset(depth - 1).limit(1)
+            ).first() if depth else None
+            if depth and last_id is None:
+                logger.info("Depth %d: not enough items", depth)
+                continue
+            offset = timed_page(session, paginate(items, Item.id, depth, None, limit), repeat)
+            cursor = encode_cursor(last_id) if last_id else None
+            keyset = timed_page(session, paginate(items, Item.id, 0, cursor, limit), repeat)
+            logger.info("Depth %d: offset %.1f ms, keyset %.1f ms", depth, offset, keyset)
+        if cleanup:
+            session.exec(delete(Item).where(Item.owner_id == user.id))
+            session.delete(user)
+            session.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=0, help="Items to insert first")
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cleanup", action="store_true", help="Delete the benchmark user and its items")
+    args = parser.parse_args()
+    benchmark(args.depths, args.limit, args.repeat, args.seed, args.cleanup)
+
+
+if __name__ == "__main__":
+    main()
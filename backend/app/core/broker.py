@@ -0,0 +1,168 @@
+import asyncio
+import time
+from typing import Any
+
+import aio_pika
+from celery import Celery
+from celery.result import AsyncResult
+from celery.utils import uuid
+from kombu import Queue
+from kombu.serialization import dumps
+
+
+class BrokerUnavailableError(Exception):
+    """
+    A task could not be published, ``retry_after`` seconds is a hint for the clients.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(BrokerUnavailableError):
+    """
+    The broker is considered down: publications fail fast until the circuit is closed again.
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Broker unavailable, retry in {retry_after:.0f}s", retry_after)
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures, then lets a single trial call through every
+    ``reset_timeout`` seconds: the circuit closes again on the first success.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    def before_call(self) -> None:
+        if self.opened_at is None:
+            return
+        elapsed = time.monotonic() - self.opened_at
+        if elapsed < self.reset_timeout:
+            raise CircuitOpenError(self.reset_timeout - elapsed)
+        # Half-open: this call is the trial, the next ones fail fast until it completes
+        self.opened_at = time.monotonic()
+
+    def on_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def on_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class AsyncTaskPublisher:
+    """
+    Publish Celery task messages from the event loop with aio-pika.
+
+    Messages are built, routed and declared like ``Celery.send_task`` does (same protocol, router and queue
+    arguments), but publishing never blocks a thread. Publications are bounded by ``timeout`` and guarded by a
+    circuit breaker: failures raise ``BrokerUnavailableError`` and, while the broker is down, requests fail fast
+    with ``CircuitOpenError``.
+    """
+
+    def __init__(self, app: Celery, url: str, timeout: float = 2.0, breaker: CircuitBreaker | None = None):
+        self.app = app
+        self.url = url
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._connection: aio_pika.abc.AbstractRobustConnection | None = None
+        self._channel: aio_pika.abc.AbstractChannel | None = None
+        self._exchanges: dict[str, aio_pika.abc.AbstractExchange] = {}
+        self._lock: asyncio.Lock | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def _get_channel(self) -> aio_pika.abc.AbstractChannel:
+        if self._loop is not asyncio.get_running_loop():
+            # Connections are bound to their event loop (e.g. one per TestClient)
+            self._loop = asyncio.get_running_loop()
+            self._lock = asyncio.Lock()
+            self._connection, self._channel = None, None
+        async with self._lock:
+            if self._channel is None or self._channel.is_closed:
+                if self._connection is None or self._connection.is_closed:
+                    self._connection = await aio_pika.connect_robust(self.url, timeout=self.timeout)
+                self._channel = await self._connection.channel(publisher_confirms=True)
+                self._exchanges = {}
+            return self._channel
+
+    async def _get_exchange(self, queue: Queue) -> aio_pika.abc.AbstractExchange:
+        # Declared once per channel, with the arguments the workers declare the queue with
+        if queue.name not in self._exchanges:
+            channel = await self._get_channel()
+            exchange = await channel.declare_exchange(
+                queue.exchange.name, queue.exchange.type, durable=queue.exchange.durable
+            )
+            declared = await channel.declare_queue(
+                queue.name, durable=queue.durable, arguments=queue.queue_arguments
+            )
+            await declared.bind(exchange, queue.routing_key)
+            self._exchanges[queue.name] = exchange
+        return self._exchanges[queue.name]
+
+    async def _publish(self, name: str, args: tuple, kwargs: dict, options: dict) -> str:
+        options = self.app.amqp.router.route(options, name, args, kwargs)
+        queue = options.pop('queue')
+        task_id = options.pop('task_id', None) or uuid()
+        # The expiry is only set in the Celery headers, like stack_shared_tasks.deadlines.strip_message_expiration
+        # does for the messages published by Celery: messages expired by RabbitMQ would be dead-lettered
+        expires = options.pop('expires', None)
+        message = self.app.amqp.as_task_v2(
+            task_id,
+            name,
+            args,
+            kwargs,
+            expires=expires,
+            time_limit=options.pop('time_limit', None),
+            soft_time_limit=options.pop('soft_time_limit', None),
+        )
+        headers = {**message.headers, **options.pop('headers', {})}
+        content_type, content_encoding, body = dumps(message.body, serializer=self.app.conf.task_serializer)
+        exchange = await self._get_exchange(queue)
+        await exchange.publish(
+            aio_pika.Message(
+                body=body if isinstance(body, bytes) else body.encode(),
+                headers=headers,
+                content_type=content_type,
+                content_encoding=content_encoding,
+                correlation_id=message.properties['correlation_id'],
+                priority=options.get('priority'),
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            ),
+            routing_key=options.get('routing_key') or queue.routing_key,
+        )
+        return task_id
+
+    async def send_task(
+            self,
+            name: str,
+            args: tuple = (),
+            kwargs: dict | None = None,
+            **options: Any,
+    ) -> AsyncResult:
+        """
+        Asynchronous ``Celery.send_task``: returns once the broker confirmed the message.
+        """
+        self.breaker.before_call()
+        try:
+            task_id = await asyncio.wait_for(self._publish(name, args, kwargs or {}, options), self.timeout)
+        except (asyncio.TimeoutError, aio_pika.exceptions.AMQPError, ConnectionError, OSError) as exc:
+            self.breaker.on_failure()
+            raise BrokerUnavailableError(
+                f"Publication of {name} failed: {exc!r}", self.breaker.reset_timeout
+            ) from exc
+        self.breaker.on_success()
+        return self.app.AsyncResult(task_id)
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            await self._connection.close()
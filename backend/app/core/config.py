@@ -42,6 +42,40 @@ class Settings(GeneralSettings):
     FIRST_SUPERUSER_PASSWORD: SecretStr
     USERS_OPEN_REGISTRATION: bool = False
 
+    # Tasks: deadline given to submitted tasks, clients can shorten it with the X-Request-Timeout header
+    TASKS_DEFAULT_TIMEOUT_SECONDS: float = 60.0
+    TASKS_MAX_TIMEOUT_SECONDS: float = 600.0
+
+    # Hedging of idempotent tasks on the *-wait routes: a duplicate is sent when a task is slower than the
+    # TASKS_HEDGING_PERCENTILE of its latency, duplicates add at most TASKS_HEDGING_BUDGET_RATIO to the tasks sent
+    TASKS_HEDGING_ENABLED: bool = False
+    TASKS_HEDGEABLE: list[str] = ["add", "multiply"]
+    TASKS_HEDGING_PERCENTILE: float = 95.0
+    TASKS_HEDGING_BUDGET_RATIO: float = 0.05
+    TASKS_HEDGING_MIN_DELAY_SECONDS: float = 0.05
+    TASKS_HEDGING_MIN_SAMPLES: int = 20
+
+    # Fair share: each user submits TASKS_FAIR_SHARE_RATE tasks per second (bursts of TASKS_FAIR_SHARE_BURST) at the
+    # highest priority, the tasks beyond it get lower priorities
+    TASKS_FAIR_SHARE_RATE: float = 10.0
+    TASKS_FAIR_SHARE_BURST: float = 100.0
+
+    # Asynchronous publication (async routes): publications time out after TASKS_PUBLISH_TIMEOUT_SECONDS, after
+    # TASKS_PUBLISH_BREAKER_FAILURES consecutive failures they fail fast for TASKS_PUBLISH_BREAKER_RESET_SECONDS
+    TASKS_PUBLISH_TIMEOUT_SECONDS: float = 2.0
+    TASKS_PUBLISH_BREAKER_FAILURES: int = 3
+    TASKS_PUBLISH_BREAKER_RESET_SECONDS: float = 10.0
+
+    # Passwords are hashed and verified by PASSWORD_HASHING_PROCESSES processes per API process, with at most
+    # PASSWORD_HASHING_MAX_PENDING calls waiting or running: further logins and password changes are answered with 503
+    PASSWORD_HASHING_PROCESSES: int = 2
+    PASSWORD_HASHING_MAX_PENDING: int = 32
+
+    # Users resolved by the authentication are cached by each process (USER_CACHE_SIZE users at most, for
+    # USER_CACHE_TTL_SECONDS), updates and deletions are broadcast to all processes with Postgres NOTIFY
+    USER_CACHE_SIZE: int = 10_000
+    USER_CACHE_TTL_SECONDS: float = 60.0
+
     OAUTH_FUSIONAUTH_ACCESS_TOKEN_URL: str
     OAUTH_FUSIONAUTH_AUTHORIZE_URL: str
     OAUTH_FUSIONAUTH_USERINFO_URL: str
@@ -1,10 +1,30 @@
+from sqlalchemy import Connection, event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import SessionTransaction
 from sqlmodel import Session, create_engine, select
 
 from app import crud
 from app.core.config import settings
 from stack_datamodel import User, UserCreateEmailPassword
+from stack_shared_tasks.metrics import instrument_pool
 
 engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+instrument_pool(engine, "api")
+# Same database through psycopg's async API, for the routes running on the event loop
+async_engine = create_async_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+instrument_pool(async_engine.sync_engine, "api_async")
+
+
+class RequestSession(Session):
+    """
+    Session of a request. Like any session it only checks out a connection on first use, which is recorded in
+    ``info["used"]``.
+    """
+
+
+@event.listens_for(RequestSession, "after_begin")
+def mark_session_used(session: Session, transaction: SessionTransaction, connection: Connection) -> None:
+    session.info["used"] = True
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
@@ -1,3 +1,11 @@
+import asyncio
+import math
+import multiprocessing
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
@@ -5,6 +13,12 @@ import jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
+from stack_shared_tasks.metrics import (
+    PASSWORD_HASHING_PENDING,
+    PASSWORD_HASHING_SECONDS,
+    PASSWORD_HASHING_SHED,
+    PASSWORD_HASHING_WAIT_SECONDS,
+)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -25,3 +39,98 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+class PasswordHashingOverloadedError(Exception):
+    """
+    Too many password hashes or verifications are pending: the request is shed, ``retry_after`` seconds is a hint
+    for the clients.
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Too many pending password checks, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def _timed(function: Callable[..., Any], *args: Any) -> tuple[float, float, Any]:
+    # Runs in the processes of the pool: wall clock start (comparable across processes) and duration of the call
+    started = time.time()
+    start = time.perf_counter()
+    result = function(*args)
+    return started, time.perf_counter() - start, result
+
+
+class PasswordHasher:
+    """
+    Hash and verify passwords in a pool of ``processes`` processes, so that bcrypt (hundreds of milliseconds of CPU
+    holding the GIL) never runs in the processes serving the requests.
+
+    At most ``max_pending`` calls are queued or running per API process: beyond that calls fail right away with
+    ``PasswordHashingOverloadedError`` rather than queueing for longer than the clients wait. The pool is started on
+    first use, with ``spawn`` since the API process runs threads and an event loop.
+    """
+
+    def __init__(self, processes: int = 2, max_pending: int = 32):
+        self.processes = processes
+        self.max_pending = max_pending
+        self.pending = 0
+        # Moving average of the duration of a call, for the Retry-After hint
+        self.average_seconds = 0.25
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _submit(self, operation: str, function: Callable[..., Any], *args: Any) -> Future:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                PASSWORD_HASHING_SHED.labels(operation=operation).inc()
+                raise PasswordHashingOverloadedError(
+                    max(1, math.ceil(self.pending * self.average_seconds / self.processes))
+                )
+            try:
+                future = self._get_executor().submit(_timed, function, *args)
+            except BrokenProcessPool:
+                # A process of the pool died: the pool cannot be used anymore, start a new one
+                self._executor = None
+                future = self._get_executor().submit(_timed, function, *args)
+            self.pending += 1
+        PASSWORD_HASHING_PENDING.inc()
+        submitted = time.time()
+
+        def done(future: Future) -> None:
+            with self._lock:
+                self.pending -= 1
+            PASSWORD_HASHING_PENDING.dec()
+            if not future.cancelled() and future.exception() is None:
+                started, duration, _ = future.result()
+                PASSWORD_HASHING_WAIT_SECONDS.observe(max(started - submitted, 0))
+                PASSWORD_HASHING_SECONDS.labels(operation=operation).observe(duration)
+                self.average_seconds += 0.1 * (duration - self.average_seconds)
+
+        future.add_done_callback(done)
+        return future
+
+    def hash(self, password: str) -> str:
+        return self._submit("hash", get_password_hash, password).result()[2]
+
+    def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return self._submit("verify", verify_password, plain_password, hashed_password).result()[2]
+
+    async def hash_async(self, password: str) -> str:
+        return (await asyncio.wrap_future(self._submit("hash", get_password_hash, password)))[2]
+
+    async def verify_async(self, plain_password: str, hashed_password: str) -> bool:
+        future = self._submit("verify", verify_password, plain_password, hashed_password)
+        return (await asyncio.wrap_future(future))[2]
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASHING_PROCESSES, settings.PASSWORD_HASHING_MAX_PENDING)
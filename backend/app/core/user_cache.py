@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+import psycopg
+from sqlalchemy import event, text
+from sqlalchemy.engine import URL
+from sqlalchemy.orm import UOWTransaction, make_transient_to_detached
+from sqlmodel import Session
+
+from app.core.config import settings
+from stack_datamodel import User
+from stack_shared_tasks.metrics import AUTH_USER_CACHE
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel of the invalidations, the payload is the id of the user
+INVALIDATION_CHANNEL = "user_invalidation"
+
+
+class UserCache:
+    """
+    Bounded LRU cache, with a time to live, of the users resolved by the authentication of the requests.
+
+    Every process of the API has its own cache, invalidated through Postgres ``NOTIFY`` when a user is updated or
+    deleted in any of them (see ``listen``). The cache is only used while the process listens to the invalidations.
+    Each ``get`` returns a new detached ``User``: requests can add it to their session and update it.
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.listening = False
+        self._users: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Incremented by every invalidation, so that a user read before an invalidation is not cached after it
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, user_id: str) -> User | None:
+        if not self.listening:
+            return None
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._users[user_id]
+                entry = None
+            if entry is not None:
+                self._users.move_to_end(user_id)
+        AUTH_USER_CACHE.labels(result="miss" if entry is None else "hit").inc()
+        if entry is None:
+            return None
+        user = User(**entry[1])
+        make_transient_to_detached(user)
+        return user
+
+    def put(self, user: User, generation: int) -> None:
+        """
+        Cache the user, unless an invalidation happened since ``generation`` (read before loading the user).
+        """
+        if not self.listening or self.max_size <= 0:
+            return
+        values = user.model_dump()
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._users[str(user.id)] = (time.monotonic() + self.ttl, values)
+            self._users.move_to_end(str(user.id))
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._generation += 1
+            self._users.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._users.clear()
+
+    async def listen(self, url: URL, retry_interval: float = 1.0) -> None:
+        """
+        Apply the invalidations sent by all the processes, until cancelled. The cache is cleared and not used while
+        the connection is down, since invalidations may have been missed.
+        """
+        conninfo = url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as connection:
+                    await connection.execute(f"LISTEN {INVALIDATION_CHANNEL}")
+                    self.listening = True
+                    async for notify in connection.notifies():
+                        self.invalidate(notify.payload)
+            except psycopg.Error:
+                logger.exception("Lost the user invalidations, retrying in %.0fs", retry_interval)
+            finally:
+                self.listening = False
+                self.clear()
+            await asyncio.sleep(retry_interval)
+
+
+@event.listens_for(Session, "after_flush")
+def notify_user_changes(session: Session, flush_context: UOWTransaction) -> None:
+    """
+    Broadcast the users updated or deleted by the flush. ``NOTIFY`` is transactional: the invalidations are only
+    delivered, to every process including this one, if the transaction is committed.
+    """
+    user_ids = {
+        str(user.id) for user in session.dirty if isinstance(user, User) and session.is_modified(user)
+    } | {str(user.id) for user in session.deleted if isinstance(user, User)}
+    for user_id in user_ids:
+        session.connection().execute(
+            text("SELECT pg_notify(:channel, :user_id)"), {"channel": INVALIDATION_CHANNEL, "user_id": user_id}
+        )
+    session.info.setdefault("invalidated_users", set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_committed_users(session: Session) -> None:
+    # The notification reaches this process a little later: requests following this one must not see the old user
+    for user_id in session.info.pop("invalidated_users", ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_rolled_back_users(session: Session) -> None:
+    session.info.pop("invalidated_users", None)
+
+
+user_cache = UserCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL_SECONDS)
@@ -1,17 +1,34 @@
 import uuid
-from typing import Any
+from typing import Any, Literal
 
-from sqlmodel import Session, select
+from sqlalchemy import Select, func, text
+from sqlmodel import Session, SQLModel, select
 
-from app.core.security import get_password_hash, verify_password
-from stack_datamodel import Item, ItemCreate, User, UserCreateEmailPassword, UserUpdate
+from app.core.security import password_hasher
+from stack_datamodel import Item, ItemCount, ItemCreate, TableCount, User, UserCreateEmailPassword, UserUpdate
+
+# exact: maintained counters, estimate: statistics of the planner, none: not counted
+CountMode = Literal["exact", "estimate", "none"]
+
+# Rows of a table according to the last ANALYZE (-1 if never analyzed)
+ESTIMATE_STATEMENT = text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(quote_ident(:table_name))")
+
+
+def table_count_statement(table_name: str) -> Select[tuple[int | None]]:
+    # Sum of the slots of the counter of the table, None when the counter is missing
+    return select(func.sum(TableCount.count)).where(TableCount.table_name == table_name)
+
+
+def exact_count_statement(table_name: str) -> Select[tuple[int]]:
+    # Fallback when the counter of the table is missing (e.g. rows inserted before the triggers were created)
+    return select(func.count()).select_from(SQLModel.metadata.tables[table_name])
 
 
 def create_user_email_and_password(*, session: Session, user_create: UserCreateEmailPassword) -> User:
     db_obj = User.model_validate(
         user_create,
         update={
-            "hashed_password": get_password_hash(user_create.password),
+            "hashed_password": password_hasher.hash(user_create.password),
         }
     )
     session.add(db_obj)
@@ -33,7 +50,7 @@ def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
     extra_data = {}
     if "password" in user_data:
         password = user_data["password"]
-        hashed_password = get_password_hash(password)
+        hashed_password = password_hasher.hash(password)
         extra_data["hashed_password"] = hashed_password
     db_user.sqlmodel_update(user_data, update=extra_data)
     session.add(db_user)
@@ -58,7 +75,7 @@ def authenticate(*, session: Session, email: str, password: str) -> User | None:
     db_user = get_user_by_email(session=session, email=email)
     if not db_user:
         return None
-    if not verify_password(password, db_user.hashed_password):
+    if not password_hasher.verify(password, db_user.hashed_password):
         return None
     return db_user
 
@@ -69,3 +86,23 @@ def create_item(*, session: Session, item_in: ItemCreate, owner_id: uuid.UUID) -
     session.commit()
     session.refresh(db_item)
     return db_item
+
+
+def count_table(*, session: Session, table_name: str, mode: CountMode) -> int | None:
+    if mode == "none":
+        return None
+    if mode == "estimate":
+        estimate = session.execute(ESTIMATE_STATEMENT, {"table_name": table_name}).scalar_one()
+        return max(int(estimate), 0)
+    count = session.execute(table_count_statement(table_name)).scalar_one()
+    if count is None:
+        return session.execute(exact_count_statement(table_name)).scalar_one()
+    return count
+
+
+def count_owner_items(*, session: Session, owner_id: uuid.UUID, mode: CountMode) -> int | None:
+    # The counter of an owner is a single row: estimating is no cheaper
+    if mode == "none":
+        return None
+    item_count = session.get(ItemCount, owner_id)
+    return item_count.count if item_count else 0
@@ -0,0 +1,183 @@
+"""
+Asynchronous versions of the functions of ``app.crud``, for the routes running on the event loop.
+
+Password hashing is CPU-bound: it runs in the pool of hashing processes so that it does not block the event loop.
+"""
+import uuid
+from collections.abc import Sequence
+from typing import Any
+
+from sqlalchemy import column, delete, insert, update, values
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.security import password_hasher
+from app.crud import ESTIMATE_STATEMENT, CountMode, exact_count_statement, table_count_statement
+from stack_datamodel import (
+    Item,
+    ItemBulkUpdate,
+    ItemCount,
+    ItemCreate,
+    User,
+    UserCreateEmailPassword,
+    UserUpdate,
+)
+
+
+async def create_user_email_and_password(*, session: AsyncSession, user_create: UserCreateEmailPassword) -> User:
+    db_obj = User.model_validate(
+        user_create,
+        update={
+            "hashed_password": await password_hasher.hash_async(user_create.password),
+        }
+    )
+    session.add(db_obj)
+    await session.commit()
+    await session.refresh(db_obj)
+    return db_obj
+
+
+async def activate_user(*, session: AsyncSession, db_user: User) -> User:
+    db_user.is_active = True
+    session.add(db_user)
+    await session.commit()
+    await session.refresh(db_user)
+    return db_user
+
+
+async def update_user(*, session: AsyncSession, db_user: User, user_in: UserUpdate) -> Any:
+    user_data = user_in.model_dump(exclude_unset=True)
+    extra_data = {}
+    if "password" in user_data:
+        password = user_data["password"]
+        hashed_password = await password_hasher.hash_async(password)
+        extra_data["hashed_password"] = hashed_password
+    db_user.sqlmodel_update(user_data, update=extra_data)
+    session.add(db_user)
+    await session.commit()
+    await session.refresh(db_user)
+    return db_user
+
+
+async def get_user_by_email(*, session: AsyncSession, email: str) -> User | None:
+    statement = select(User).where(User.email == email)
+    session_user = (await session.exec(statement)).first()
+    return session_user
+
+
+async def get_user_by_id(*, session: AsyncSession, id: str) -> User | None:
+    statement = select(User).where(User.id == id)
+    session_user = (await session.exec(statement)).first()
+    return session_user
+
+
+async def authenticate(*, session: AsyncSession, email: str, password: str) -> User | None:
+    db_user = await get_user_by_email(session=session, email=email)
+    if not db_user:
+        return None
+    if not await password_hasher.verify_async(password, db_user.hashed_password):
+        return None
+    return db_user
+
+
+async def create_item(*, session: AsyncSession, item_in: ItemCreate, owner_id: uuid.UUID) -> Item:
+    db_item = Item.model_validate(item_in, update={"owner_id": owner_id})
+    session.add(db_item)
+    await session.commit()
+    await session.refresh(db_item)
+    return db_item
+
+
+async def create_items(
+    *, session: AsyncSession, items_in: Sequence[ItemCreate], owner_id: uuid.UUID
+) -> Sequence[Item]:
+    """
+    Insert the items with multi-row ``INSERT ... RETURNING`` statements (up to 1000 rows each) in one transaction.
+    """
+    rows = [{"id": uuid.uuid4(), "owner_id": owner_id, **item_in.model_dump()} for item_in in items_in]
+    items = (await session.scalars(insert(Item).returning(Item, sort_by_parameter_order=True), rows)).all()
+    await session.commit()
+    return items
+
+
+async def copy_items(*, session: AsyncSession, items_in: Sequence[ItemCreate], owner_id: uuid.UUID) -> int:
+    """
+    Load the items with ``COPY item FROM STDIN``, in the transaction of the session (not committed).
+    """
+    connection = await (await session.connection()).get_raw_connection()
+    async with connection.driver_connection.cursor() as cursor:
+        async with cursor.copy("COPY item (id, title, description, owner_id) FROM STDIN") as copy:
+            for item_in in items_in:
+                await copy.write_row((uuid.uuid4(), item_in.title, item_in.description, owner_id))
+    return len(items_in)
+
+
+async def update_items(
+    *, session: AsyncSession, items_in: Sequence[ItemBulkUpdate], owner_id: uuid.UUID | None
+) -> Sequence[Item]:
+    """
+    Update the items with one ``UPDATE ... FROM (VALUES ...)`` per set of updated fields, in one transaction.
+    ``owner_id`` restricts the update to the items of that owner (``None`` for all of them). Items that were not
+    found are missing from the result. Ids must be unique.
+    """
+    groups: dict[tuple[str, ...], list[dict[str, Any]]] = {}
+    for item_in in items_in:
+        row = item_in.model_dump(exclude_unset=True)
+        groups.setdefault(tuple(sorted(row.keys() - {"id"})), []).append(row)
+    items: list[Item] = []
+    for fields, rows in groups.items():
+        if fields:
+            names = ("id", *fields)
+            rows_values = values(*(column(name, Item.__table__.c[name].type) for name in names), name="v").data(
+                [tuple(row[name] for name in names) for row in rows]
+            )
+            statement = (
+                update(Item)
+                .where(Item.id == rows_values.c.id)
+                .values({name: rows_values.c[name] for name in fields})
+                .returning(Item)
+                .execution_options(synchronize_session=False)
+            )
+        else:
+            # Nothing to update, the items are returned as they are
+            statement = select(Item).where(Item.id.in_([row["id"] for row in rows]))
+        if owner_id is not None:
+            statement = statement.where(Item.owner_id == owner_id)
+        items.extend((await session.scalars(statement)).all())
+    await session.commit()
+    return items
+
+
+async def delete_items(
+    *, session: AsyncSession, ids: Sequence[uuid.UUID], owner_id: uuid.UUID | None
+) -> Sequence[Item]:
+    """
+    Delete the items with a single ``DELETE ... RETURNING``. ``owner_id`` restricts the deletion to the items of that
+    owner (``None`` for all of them). Items that were not found are missing from the result.
+    """
+    statement = delete(Item).where(Item.id.in_(ids)).returning(Item).execution_options(synchronize_session=False)
+    if owner_id is not None:
+        statement = statement.where(Item.owner_id == owner_id)
+    items = (await session.scalars(statement)).all()
+    await session.commit()
+    return items
+
+
+async def count_table(*, session: AsyncSession, table_name: str, mode: CountMode) -> int | None:
+    if mode == "none":
+        return None
+    if mode == "estimate":
+        estimate = (await session.execute(ESTIMATE_STATEMENT, {"table_name": table_name})).scalar_one()
+        return max(int(estimate), 0)
+    count = (await session.execute(table_count_statement(table_name))).scalar_one()
+    if count is None:
+        return (await session.execute(exact_count_statement(table_name))).scalar_one()
+    return count
+
+
+async def count_owner_items(*, session: AsyncSession, owner_id: uuid.UUID, mode: CountMode) -> int | None:
+    # The counter of an owner is a single row: estimating is no cheaper
+    if mode == "none":
+        return None
+    item_count = await session.get(ItemCount, owner_id)
+    return item_count.count if item_count else 0
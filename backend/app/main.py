@@ -1,11 +1,23 @@
+import asyncio
+import math
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 import sentry_sdk
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.routing import APIRoute
+from prometheus_client import make_asgi_app
 from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 
 from app.api.main import api_router
+from app.api.routes.tasks import publisher
 from app.core.config import settings
+from app.core.db import async_engine
+from app.core.security import PasswordHashingOverloadedError, password_hasher
+from app.core.user_cache import user_cache
+from stack_shared_tasks.metrics import get_registry
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -15,11 +27,35 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    listener = asyncio.create_task(user_cache.listen(async_engine.url))
+    yield
+    listener.cancel()
+    password_hasher.shutdown()
+    await publisher.close()
+    # Async connections belong to the event loop that opened them
+    await async_engine.dispose()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
+    lifespan=lifespan,
 )
+
+
+# Logins and password changes shed when the pool of hashing processes is saturated, wherever the hashing happens
+@app.exception_handler(PasswordHashingOverloadedError)
+async def password_hashing_overloaded(request: Request, exc: PasswordHashingOverloadedError) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many password checks in progress"},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+
 # we need this to save temporary code & state in session (OAuth)
 app.add_middleware(SessionMiddleware, secret_key="some-random-string")
 
@@ -35,3 +71,4 @@ if settings.all_cors_origins:
     )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
+app.mount("/metrics", make_asgi_app(registry=get_registry()))
@@ -1,9 +1,11 @@
+import json
 import uuid
 
 from fastapi.testclient import TestClient
-from sqlmodel import Session
+from sqlmodel import Session, func, select
 
 from app.core.config import settings
+from stack_datamodel import Item, ItemCount
 from tests.utils.item import create_random_item
 
 
@@ -79,6 +81,66 @@ def test_read_items(
     assert len(content["data"]) >= 2
 
 
+def test_read_items_cursor_pages(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    for _ in range(5):
+        create_random_item(db)
+    ids = []
+    cursor = None
+    while True:
+        params = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+        response = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=superuser_token_headers,
+            params=params,
+        )
+        assert response.status_code == 200
+        content = response.json()
+        ids += [item["id"] for item in content["data"]]
+        cursor = content["next_cursor"]
+        if cursor is None:
+            break
+    # Every item exactly once, in the order of the ids
+    assert len(ids) == content["count"]
+    assert ids == sorted(ids, key=uuid.UUID)
+
+
+def test_read_items_counts(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    # The counters are maintained by triggers: they match COUNT(*)
+    response = client.get(
+        f"{settings.API_V1_STR}/items/", headers=superuser_token_headers, params={"limit": 1}
+    )
+    assert response.json()["count"] == db.exec(select(func.count()).select_from(Item)).one()
+    owner_count = db.get(ItemCount, item.owner_id)
+    assert owner_count is not None and owner_count.count == 1
+    response = client.get(
+        f"{settings.API_V1_STR}/items/", headers=superuser_token_headers, params={"count": "none"}
+    )
+    assert response.status_code == 200
+    assert response.json()["count"] is None
+    response = client.get(
+        f"{settings.API_V1_STR}/items/", headers=superuser_token_headers, params={"count": "estimate"}
+    )
+    assert response.status_code == 200
+    assert response.json()["count"] >= 0
+
+
+def test_read_items_invalid_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={"cursor": "not-a-cursor"},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
 def test_update_item(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -162,3 +224,140 @@ def test_delete_item_not_enough_permissions(
     assert response.status_code == 400
     content = response.json()
     assert content["detail"] == "Not enough permissions"
+
+
+def test_bulk_create_items(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    data = [{"title": "Foo"}, {"title": ""}, {"title": "Bar", "description": "Baz"}]
+    response = client.post(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=superuser_token_headers,
+        json={"data": data},
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert [item["title"] for item in content["data"]] == ["Foo", "Bar"]
+    assert [error["index"] for error in content["errors"]] == [1]
+
+
+def test_bulk_update_items(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    first = create_random_item(db)
+    second = create_random_item(db)
+    missing = str(uuid.uuid4())
+    data = [
+        {"id": str(first.id), "title": "Updated"},
+        {"id": str(second.id), "description": "Updated"},
+        {"id": missing, "title": "Updated"},
+        {"id": str(first.id), "title": "Again"},
+        {"id": str(second.id), "title": None},
+    ]
+    response = client.patch(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=superuser_token_headers,
+        json={"data": data},
+    )
+    assert response.status_code == 200
+    content = response.json()
+    updated = {item["id"]: item for item in content["data"]}
+    assert updated[str(first.id)]["title"] == "Updated"
+    assert updated[str(second.id)]["title"] == second.title
+    assert updated[str(second.id)]["description"] == "Updated"
+    assert content["errors"][:2] == [
+        {"index": 2, "detail": "Item not found"},
+        {"index": 3, "detail": "Duplicate id"},
+    ]
+    assert content["errors"][2]["index"] == 4
+    assert content["errors"][2]["detail"][0]["loc"] == ["title"]
+    assert len(content["errors"]) == 3
+
+
+def test_bulk_delete_items_not_enough_permissions(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    response = client.request(
+        "DELETE",
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=normal_user_token_headers,
+        json={"ids": [str(item.id)]},
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert content["data"] == []
+    assert content["errors"] == [{"index": 0, "detail": "Item not found"}]
+    assert db.get(Item, item.id)
+
+
+def test_export_items(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    response = client.get(
+        f"{settings.API_V1_STR}/items/export",
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == sorted(row["id"] for row in rows)
+    assert {"id": str(item.id), "title": item.title, "description": item.description,
+            "owner_id": str(item.owner_id)} in rows
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/export",
+        headers=superuser_token_headers,
+        params={"format": "csv"},
+    )
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines[0] == "id,title,description,owner_id"
+    assert len(lines) == len(rows) + 1
+
+
+def test_import_items(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    body = 'title,description\nFoo,"Multi\nline"\n,Missing title\nBar,\n'
+    import_id = str(uuid.uuid4())
+    response = client.post(
+        f"{settings.API_V1_STR}/items/import",
+        headers=normal_user_token_headers,
+        params={"format": "csv", "import_id": import_id},
+        # With the byte order mark of some spreadsheet exports
+        content=body.encode("utf-8-sig"),
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert content["id"] == import_id
+    assert content["imported"] == 2
+    assert content["error_count"] == 1
+    assert content["complete"]
+    assert [error["index"] for error in content["errors"]] == [1]
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/import/{import_id}",
+        headers=normal_user_token_headers,
+    )
+    assert response.status_code == 200
+    progress = response.json()
+    assert (progress["read"], progress["imported"], progress["complete"]) == (3, 2, True)
+
+    response = client.post(
+        f"{settings.API_V1_STR}/items/import",
+        headers=normal_user_token_headers,
+        params={"format": "csv", "import_id": import_id},
+        content=body.encode(),
+    )
+    assert response.status_code == 409
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/export",
+        headers=normal_user_token_headers,
+    )
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert {"title": "Foo", "description": "Multi\nline"} in [
+        {"title": row["title"], "description": row["description"]} for row in rows
+    ]
@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+
+from app.api.deps import get_task_deadline
+from app.core.config import settings
+from app.core.user_cache import UserCache
+from stack_datamodel import User
+
+
+def test_task_deadline_default() -> None:
+    deadline = get_task_deadline()
+    remaining = (deadline - datetime.now(timezone.utc)).total_seconds()
+    assert 0 < remaining <= settings.TASKS_DEFAULT_TIMEOUT_SECONDS
+
+
+def test_task_deadline_from_header() -> None:
+    deadline = get_task_deadline(x_request_timeout=2.0)
+    remaining = (deadline - datetime.now(timezone.utc)).total_seconds()
+    assert 0 < remaining <= 2.0
+
+
+def test_task_deadline_capped() -> None:
+    deadline = get_task_deadline(x_request_timeout=settings.TASKS_MAX_TIMEOUT_SECONDS * 10)
+    remaining = (deadline - datetime.now(timezone.utc)).total_seconds()
+    assert remaining <= settings.TASKS_MAX_TIMEOUT_SECONDS
+
+
+def test_user_cache() -> None:
+    cache = UserCache(max_size=1, ttl=60)
+    cache.listening = True
+    user = User(email="cached@example.com", hashed_password="hash", is_active=True)
+    cache.put(user, cache.generation)
+    cached = cache.get(str(user.id))
+    assert cached is not None and cached is not user
+    assert (cached.id, cached.email, cached.is_active) == (user.id, user.email, user.is_active)
+
+    cache.invalidate(str(user.id))
+    assert cache.get(str(user.id)) is None
+
+
+def test_user_cache_skips_users_read_before_an_invalidation() -> None:
+    cache = UserCache(max_size=1, ttl=60)
+    cache.listening = True
+    user = User(email="cached@example.com", hashed_password="hash")
+    generation = cache.generation
+    cache.invalidate(str(user.id))
+    cache.put(user, generation)
+    assert cache.get(str(user.id)) is None
+
+
+def test_user_cache_not_used_without_invalidations() -> None:
+    cache = UserCache(max_size=1, ttl=60)
+    user = User(email="cached@example.com", hashed_password="hash")
+    cache.put(user, cache.generation)
+    assert cache.get(str(user.id)) is None
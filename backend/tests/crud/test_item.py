@@ -0,0 +1,43 @@
+import json
+import uuid
+
+from sqlalchemy import text
+from sqlmodel import delete, select
+
+from app.api.pagination import encode_cursor, paginate
+from app.core.db import engine
+from stack_datamodel import Item
+
+
+def plan_indexes(statement) -> set[str]:
+    """
+    Indexes used by the plan of the statement (planned as if sequential scans were expensive, so that the small
+    tables of the tests do not hide a missing index). Planned on a connection of its own, rolled back when closed.
+    """
+    with engine.connect() as connection:
+        connection.execute(text("SET LOCAL enable_seqscan = off"))
+        sql = statement.compile(connection, compile_kwargs={"literal_binds": True})
+        plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    def walk(node: dict):
+        if "Index Name" in node:
+            yield node["Index Name"]
+        for child in node.get("Plans", []):
+            yield from walk(child)
+
+    return set(walk(plan[0]["Plan"]))
+
+
+def test_owner_items_page_uses_index() -> None:
+    items = select(Item).where(Item.owner_id == uuid.uuid4())
+    assert "ix_item_owner_id_id" in plan_indexes(paginate(items, Item.id, 0, None, 100))
+    cursor = encode_cursor(uuid.uuid4())
+    assert "ix_item_owner_id_id" in plan_indexes(paginate(items, Item.id, 0, cursor, 100))
+
+
+def test_owner_items_delete_uses_index() -> None:
+    # What the ON DELETE CASCADE from user runs
+    statement = delete(Item).where(Item.owner_id == uuid.uuid4())
+    assert "ix_item_owner_id_id" in plan_indexes(statement)
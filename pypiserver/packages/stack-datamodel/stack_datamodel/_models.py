@@ -1,7 +1,9 @@
 import uuid
+from typing import Any
 
 import email_validator
-from pydantic import EmailStr
+from pydantic import EmailStr, field_validator
+from sqlalchemy import Index
 from sqlmodel import Field, Relationship, SQLModel
 from datetime import datetime
 
@@ -72,7 +74,10 @@ class UserPublic(UserBase):
 
 class UsersPublic(SQLModel):
     data: list[UserPublic]
-    count: int
+    # None when not requested (count=none)
+    count: int | None
+    # Cursor of the next page, None on the last one
+    next_cursor: str | None = None
 
 
 # Shared properties
@@ -93,6 +98,9 @@ class ItemUpdate(ItemBase):
 
 # Database model, database table inferred from class name
 class Item(ItemBase, table=True):
+    # Listings of an owner in id order (pagination) and the cascade from user (migration c8d4a6e2f915)
+    __table_args__ = (Index("ix_item_owner_id_id", "owner_id", "id"),)
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     title: str = Field(max_length=255)
     owner_id: uuid.UUID = Field(
@@ -109,7 +117,107 @@ class ItemPublic(ItemBase):
 
 class ItemsPublic(SQLModel):
     data: list[ItemPublic]
-    count: int
+    # None when not requested (count=none)
+    count: int | None
+    # Cursor of the next page, None on the last one
+    next_cursor: str | None = None
+
+
+# Bulk writes: rows are validated one by one so that an invalid row is reported without rejecting the others
+class ItemsBulkCreate(SQLModel):
+    data: list[dict[str, Any]] = Field(min_length=1, max_length=10_000)
+
+
+# Row of a bulk update: the fields of ItemUpdate and the id of the item
+class ItemBulkUpdate(ItemUpdate):
+    id: uuid.UUID
+
+    # The title may be left out but not cleared: the column is NOT NULL
+    @field_validator("title")
+    @classmethod
+    def title_not_null(cls, value: str | None) -> str:
+        if value is None:
+            raise ValueError("title may not be null")
+        return value
+
+
+class ItemsBulkUpdate(SQLModel):
+    data: list[dict[str, Any]] = Field(min_length=1, max_length=10_000)
+
+
+class ItemsBulkDelete(SQLModel):
+    ids: list[uuid.UUID] = Field(min_length=1, max_length=10_000)
+
+
+# Row of a bulk request that was not written, index is its position in the request
+class BulkError(SQLModel):
+    index: int
+    detail: Any
+
+
+class ItemsBulkResult(SQLModel):
+    data: list[ItemPublic]
+    errors: list[BulkError]
+
+
+# Progress of an import, committed with each batch: complete is False while the import runs and when it stopped
+# early (detail tells why), the rows read until then that were valid are imported
+class ItemImportBase(SQLModel):
+    read: int = 0
+    imported: int = 0
+    error_count: int = 0
+    complete: bool = False
+    detail: str | None = None
+
+
+# Database model, progress of the imports (migration e7b3c1f9a246)
+class ItemImport(ItemImportBase, table=True):
+    id: uuid.UUID = Field(primary_key=True)
+    owner_id: uuid.UUID = Field(foreign_key="user.id", nullable=False, ondelete="CASCADE")
+    update_time: datetime = Field(default_factory=datetime.now, nullable=False)
+
+
+class ItemImportPublic(ItemImportBase):
+    id: uuid.UUID
+    update_time: datetime
+
+
+# Result of an import: only the first errors are listed, error_count counts all of them
+class ItemsImportResult(ItemImportBase):
+    id: uuid.UUID
+    errors: list[BulkError]
+
+
+# Items of each owner, maintained by triggers on the item table (migration b5e1f0c3a872)
+class ItemCount(SQLModel, table=True):
+    owner_id: uuid.UUID = Field(foreign_key="user.id", primary_key=True, ondelete="CASCADE")
+    count: int = 0
+
+
+# Rows of the item and user tables, maintained by triggers (migration b5e1f0c3a872). Each statement adds to a random
+# slot so that the writers of a table do not wait for each other: the count of a table is the sum of its slots
+class TableCount(SQLModel, table=True):
+    table_name: str = Field(primary_key=True, max_length=63)
+    slot: int = Field(primary_key=True)
+    count: int = 0
+
+
+# Chunks of the results streamed by the tasks, in the order they were produced (data is a JSON document)
+class TaskResultChunk(SQLModel, table=True):
+    task_id: str = Field(primary_key=True, max_length=155)
+    seq: int = Field(primary_key=True)
+    data: str
+    creation_time: datetime = Field(default_factory=datetime.now, nullable=False)
+
+
+# Profiles of the tasks, as collapsed stacks ("outer;...;inner count" lines, most sampled first)
+class TaskProfile(SQLModel, table=True):
+    task_id: str = Field(primary_key=True, max_length=155)
+    task_name: str | None = Field(default=None, max_length=155)
+    duration: float
+    samples: int
+    stacks: str
+    creation_time: datetime = Field(default_factory=datetime.now, nullable=False)
 
 
 # Generic message
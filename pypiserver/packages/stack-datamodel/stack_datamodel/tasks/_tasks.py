@@ -10,6 +10,11 @@ class SampleResultSchema(SQLModel):
     s: float
 
 
+class SampleStreamPayloadSchema(SampleBaseRandomVariablePayloadSchema):
+    size: int = Field(gt=0, le=100_000_000)
+    chunk_size: int = Field(default=10_000, gt=0, le=100_000)
+
+
 class BinaryOperandsPayloadSchema(SQLModel):
     a: float
     b: float
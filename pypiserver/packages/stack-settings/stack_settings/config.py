@@ -1,7 +1,7 @@
 import warnings
 from datetime import timedelta
 import pytz
-from typing import Literal, Union, Dict
+from typing import Literal, Union, Dict, List
 
 from pydantic import (
     HttpUrl,
@@ -48,6 +48,9 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    # Database of the Celery results, defaults to POSTGRES_DB (the tables are then created by the backend migrations)
+    CELERY_BACKEND_DB: str = ""
+
     @computed_field
     @property
     def CELERY_BACKEND_DB_URI(self) -> PostgresDsn:
@@ -57,7 +60,7 @@ class Settings(BaseSettings):
             password=self.POSTGRES_PASSWORD.get_secret_value(),
             host=self.POSTGRES_SERVER,
             port=self.POSTGRES_PORT,
-            path=self.POSTGRES_DB,
+            path=self.CELERY_BACKEND_DB or self.POSTGRES_DB,
         )
 
     # Mailing
@@ -106,6 +109,15 @@ class Settings(BaseSettings):
             port=self.RABBITMQ_PORT
         )
 
+    # Worker replicas: shards of the queues are split among the replicas of a worker (see task_queue_shards)
+    WORKER_REPLICA_INDEX: int = 0
+    WORKER_REPLICAS: int = 1
+    # Replica 0 moves the messages of the retired shards; with a worker_topology only its first pool does
+    WORKER_REBALANCE_SHARDS: bool = True
+
+    # Prometheus metrics (workers expose them on this port, the backend on /metrics)
+    METRICS_PORT: int | None = None
+
     def _check_default_secret(self, var_name: str, value: SecretStr | str | None) -> None:
         if (value is not None) and ("changethis" in str(value)):
             message = (
@@ -144,11 +156,27 @@ class CeleryConfig(BaseSettings):
         'task': 'celery_taskmeta',
         'group': 'celery_groupmeta',
     }
+    # Pool of the result backend engine (stack_shared_tasks.backends.PooledDatabaseBackend), one per process and
+    # separate from the API pool. Queries running longer than the statement timeout are cancelled.
+    database_engine_options: dict = {
+        'pool_size': 5,
+        'max_overflow': 5,
+        'pool_timeout': 5,
+        'pool_pre_ping': True,
+        'connect_args': {'options': '-c statement_timeout=5000'},
+    }
     enable_utc: bool = True
     result_expires: Union[None, float, timedelta] = None
     result_persistent: bool = True
     result_extended: bool = True
+    # Worker result writes (stack_shared_tasks.backends.BatchedDatabaseBackend): one upsert every result_batch_size
+    # results or result_batch_interval seconds. Batches are shared by the tasks running concurrently in a process and
+    # bounded by their number (worker_concurrency of a threads pool, 1 for prefork).
+    result_batch_size: int = 32
+    result_batch_interval: float = 0.005
     task_create_missing_queues: bool = True
+    # Priorities 0 (lowest) ... task_queue_max_priority of the messages (x-max-priority of the queues)
+    task_queue_max_priority: int = 9
     task_default_queue: str = 'celery'
     broker_use_ssl: Union[None, dict] = None  # Not set for now
     broker_pool_limit: Union[None, int] = 10
@@ -156,6 +184,40 @@ class CeleryConfig(BaseSettings):
     broker_connection_timeout: float = 4.0
     broker_connection_retry_on_startup: bool = True
     broker_connection_max_retries: Union[None, int] = 100
+    # Retries of the publication of a message; the first interval is randomized per process (see
+    # stack_shared_tasks.retries.publish_retry_policy)
+    task_publish_retry_policy: dict = {
+        'max_retries': 3,
+        'interval_step': 0.2,
+        'interval_max': 1.0,
+    }
+    # Messages are acknowledged once the task has run, failures and time limits included: they are never
+    # dead-lettered by a failure. Tasks opt into dead-lettering with dead_letter=True in their options: their
+    # message is rejected to "<queue>.dlq" once their retries are exhausted (stack_shared_tasks.retries.with_retries)
+    task_acks_late: bool = True
+    task_acks_on_failure_or_timeout: bool = True
+    # Workers reserve one message per process at a time (with late acknowledgements, the running one): prefetched
+    # messages would bypass the priorities
+    worker_prefetch_multiplier: int = 1
+    # Consecutive chain links a worker runs in-process when it consumes their queue, before storing a checkpoint
+    # result and publishing the rest of the chain (0 disables the fusion)
+    task_chain_fusion_checkpoint: int = 100
+    # Fraction of the tasks profiled without being requested (the "profile" header), and seconds between two samples
+    # of their stack
+    task_profile_sample_rate: float = 0.0
+    task_profile_interval: float = 0.005
+    # Worker processes are replaced between two tasks past worker_max_memory_per_child kilobytes (peak resident
+    # memory) or worker_max_tasks_per_child tasks. The tasks growing a process by more than
+    # worker_memory_growth_warning kilobytes are logged, with their top allocators when
+    # worker_memory_track_allocations is set (tracemalloc: slows down the tasks, for investigations)
+    worker_max_tasks_per_child: Union[None, int] = None
+    worker_max_memory_per_child: Union[None, int] = None
+    worker_memory_growth_warning: int = 51_200
+    worker_memory_track_allocations: bool = False
+    # Pools run side by side by ``python -m stack_shared_tasks.topology``, by name: the queues each pool consumes and
+    # the settings overriding this configuration in its worker (e.g. worker_pool, worker_concurrency). Empty: a
+    # single pool, consuming the queues given on the command line.
+    worker_topology: Dict[str, dict] = {}
 
     beat_schedule: dict = {}  # Don't know yet if this goes here or only in the worker
 
@@ -163,6 +225,20 @@ class CeleryConfig(BaseSettings):
         'add': {'queue': 'shared'},
         'multiply': {'queue': 'alpha'},
         'sample-normal': {'queue': 'beta'},
+        'sample-normal-stream': {'queue': 'beta'},
         'multiply-by-summation': {'queue': 'alpha'}
     }
 
+    # Number of sub-queues ("alpha.0" ... "alpha.<n-1>") tasks submitted with an affinity key are hashed onto.
+    # Queues not listed are not sharded.
+    task_queue_shards: Dict[str, int] = {}
+
+    # Queues able to serve a task, least loaded first (task_routes is the fallback when the stats are stale).
+    # The workers consume "shared" and their own queue, and all of them register the shared tasks.
+    # The beta queue only holds CPU-heavy tasks (see worker_topology): cheap tasks are not sent behind them.
+    task_eligible_queues: Dict[str, List[str]] = {
+        'add': ['shared', 'alpha'],
+    }
+    task_queue_stats_interval: float = 2.0  # seconds between two samples of the queues depth and consumers
+    task_queue_stats_max_age: float = 10.0  # seconds after which the samples are stale
+
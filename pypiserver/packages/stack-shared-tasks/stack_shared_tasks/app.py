@@ -0,0 +1,23 @@
+from celery import Celery
+from celery.signals import before_task_publish
+
+from stack_settings import CeleryConfig
+
+from .deadlines import strip_message_expiration
+from .queues import configure_queues
+from .retries import configure_retries
+from .routing import configure_routing
+
+
+def configure_app(app: Celery, celery_config: CeleryConfig) -> None:
+    """
+    Shared configuration of the applications sending tasks (the backend and the workers, which publish
+    the next links of chains and the retries): routing, queue declarations, publish retry policy and
+    deadlines carried by the ``expires`` header only.
+
+    Must run after ``config_from_object`` and before the first task is sent.
+    """
+    configure_routing(app, celery_config)
+    configure_queues(app, celery_config)
+    configure_retries(app, celery_config)
+    before_task_publish.connect(strip_message_expiration, weak=False, dispatch_uid='strip_message_expiration')
@@ -0,0 +1,183 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from celery.backends.database import DatabaseBackend, retry, session_cleanup
+from celery.backends.database.session import SessionManager
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DatabaseError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlmodel import SQLModel
+
+from stack_datamodel import TaskProfile, TaskResultChunk
+
+from .metrics import RESULTS_FLUSH_SECONDS, RESULTS_FLUSH_SIZE, instrument_pool
+
+logger = logging.getLogger(__name__)
+
+# Tables written next to the results (chunks of streaming tasks, task profiles): they live in the results database,
+# which may not be the application database (CELERY_BACKEND_DB), and are only created here (not by the migrations)
+RESULT_TABLES = [TaskResultChunk.__table__, TaskProfile.__table__]
+PREPARE_TABLES_MAX_RETRIES = 10
+# Pools running several tasks at a time in a process
+CONCURRENT_POOLS = {'threads', 'gevent', 'eventlet'}
+
+
+def prepare_result_tables(engine: Engine) -> None:
+    """
+    Create the ``RESULT_TABLES`` missing from the results database. Like Celery does for its own tables, a failure
+    is retried: processes starting together race between the existence checks and the creation.
+    """
+    for retry in range(PREPARE_TABLES_MAX_RETRIES + 1):
+        try:
+            SQLModel.metadata.create_all(engine, tables=RESULT_TABLES)
+            return
+        except DatabaseError:
+            if retry == PREPARE_TABLES_MAX_RETRIES:
+                raise
+
+
+def backend_url(database_uri, backend_cls: type) -> str:
+    """
+    ``result_backend`` URL selecting a custom database backend class, e.g.
+    ``stack_shared_tasks.backends:BatchedDatabaseBackend+postgresql+psycopg://...``.
+    """
+    return f'{backend_cls.__module__}:{backend_cls.__name__}+{str(database_uri).removeprefix("db+")}'
+
+
+class PooledDatabaseBackend(DatabaseBackend):
+    """
+    Database result backend with a connection pool of its own in each process, sized by
+    ``database_engine_options``.
+
+    Celery's database backend only pools connections in forked worker processes: elsewhere (e.g. the API polling
+    results) every query opens a new connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._engine: Engine | None = None
+        self._session_factory: sessionmaker | None = None
+        self._session_pid: int | None = None
+        self._engine_lock = threading.Lock()
+
+    def _prepare(self) -> None:
+        if self._session_pid != os.getpid():
+            with self._engine_lock:
+                if self._session_pid != os.getpid():
+                    # Connections of the parent process must not be shared after a fork
+                    engine = create_engine(self.url, **self.engine_options)
+                    instrument_pool(engine, 'results')
+                    SessionManager().prepare_models(engine)
+                    prepare_result_tables(engine)
+                    self._engine = engine
+                    self._session_factory = sessionmaker(bind=engine)
+                    self._session_pid = os.getpid()
+
+    @property
+    def engine(self) -> Engine:
+        """
+        Engine of the results database in this process, for the tables stored next to the results.
+        """
+        self._prepare()
+        return self._engine
+
+    def ResultSession(self, session_manager=None) -> Session:
+        self._prepare()
+        return self._session_factory()
+
+
+class BatchedDatabaseBackend(PooledDatabaseBackend):
+    """
+    Database result backend writing the results of a process in batches.
+
+    Results are buffered and written by a background thread with one multi-row upsert every
+    ``result_batch_size`` results or ``result_batch_interval`` seconds after the first buffered one. A failed
+    upsert is retried like the writes of ``DatabaseBackend``. ``store_result`` returns once the batch holding the
+    result is committed, so a message acknowledged late (``task_acks_late``) is acknowledged after its result is
+    stored; messages acknowledged early may be acknowledged before.
+
+    The tasks running concurrently in a process share its batches: batches are bounded by the concurrency of the
+    ``threads`` (or ``gevent``) pool, while prefork children run one task at a time and write their results
+    without waiting for others.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        concurrency = 1
+        if self.app.conf.get('worker_pool') in CONCURRENT_POOLS:
+            concurrency = self.app.conf.get('worker_concurrency') or 1
+        # A batch never waits for more results than the tasks that can run together in the process
+        self.batch_size = max(min(self.app.conf.get('result_batch_size') or 1, concurrency), 1)
+        self.batch_interval = self.app.conf.get('result_batch_interval') or 0.0
+        self._pending: queue.Queue[tuple[dict, Future]] = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid: int | None = None
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # Results buffered by the parent belong to its own flusher
+                self._pending = queue.Queue()
+                threading.Thread(target=self._run, name='result-writer', daemon=True).start()
+                self._pid = os.getpid()
+
+    def _row(self, task_id, result, state, traceback, request) -> dict:
+        task = self.task_cls(task_id)
+        self._update_result(task, result, state, traceback=traceback, request=request)
+        return {
+            column.name: getattr(task, column.name)
+            for column in self.task_cls.__table__.columns if column.name != 'id'
+        }
+
+    def _store_result(self, task_id, result, state, traceback=None, request=None, **kwargs):
+        self._ensure_started()
+        written = Future()
+        self._pending.put((self._row(task_id, result, state, traceback, request), written))
+        written.result()
+
+    def _next_batch(self) -> list[tuple[dict, Future]]:
+        batch = [self._pending.get()]
+        flush_at = time.monotonic() + self.batch_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._pending.get(timeout=max(0.0, flush_at - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    @retry
+    def _flush(self, rows: list[dict]) -> None:
+        # Several states of a task in the same batch (e.g. retries): the last one wins
+        rows = list({row['task_id']: row for row in rows}.values())
+        statement = insert(self.task_cls.__table__).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=['task_id'],
+            set_={name: statement.excluded[name] for name in rows[0] if name != 'task_id'},
+        )
+        session = self.ResultSession()
+        with session_cleanup(session):
+            session.execute(statement)
+            session.commit()
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            start = time.monotonic()
+            try:
+                self._flush([row for row, _ in batch])
+            except Exception as exc:
+                logger.warning('Writing a batch of %d results failed', len(batch), exc_info=True)
+                for _, written in batch:
+                    written.set_exception(exc)
+                continue
+            RESULTS_FLUSH_SIZE.observe(len(batch))
+            RESULTS_FLUSH_SECONDS.observe(time.monotonic() - start)
+            for _, written in batch:
+                written.set_result(None)
@@ -0,0 +1,35 @@
+from celery import Task
+
+from .fusion import run_fused_links
+from .profiling import StackSampler, profiling_requested, store_profile
+
+
+class StackTask(Task):
+    """
+    Base class of the tasks executed by the stack workers.
+
+    Set it as ``task_cls`` of the worker applications.
+    """
+
+    Strategy = 'stack_shared_tasks.deadlines:deadline_strategy'
+
+    def __call__(self, *args, **kwargs):
+        if self.request.called_directly:
+            return super().__call__(*args, **kwargs)
+        # Executed by the worker: the tracer already pushed the request
+        if profiling_requested(self):
+            sampler = StackSampler(self.app.conf.get('task_profile_interval') or 0.005)
+            try:
+                with sampler:
+                    return self._execute(*args, **kwargs)
+            finally:
+                # Failed and timed out tasks are profiled too
+                store_profile(self, sampler)
+        return self._execute(*args, **kwargs)
+
+    def _execute(self, *args, **kwargs):
+        retval = self.run(*args, **kwargs)
+        max_links = self.app.conf.get('task_chain_fusion_checkpoint') or 0
+        if max_links and self.request.chain:
+            retval = run_fused_links(self, retval, max_links)
+        return retval
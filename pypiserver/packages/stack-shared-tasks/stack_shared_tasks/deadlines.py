@@ -0,0 +1,71 @@
+import logging
+from datetime import datetime, timezone
+from typing import Any
+
+from celery.utils.time import maybe_iso8601, maybe_make_aware
+from celery.worker.strategy import default as default_strategy
+
+from .metrics import TASKS_EXPIRED_DROPPED
+
+logger = logging.getLogger(__name__)
+
+# Time given to a task to clean up after the soft time limit before it is killed
+HARD_TIME_LIMIT_GRACE_SECONDS = 5.0
+
+
+def seconds_until(deadline: datetime) -> float:
+    return (deadline - datetime.now(timezone.utc)).total_seconds()
+
+
+def deadline_options(deadline: datetime) -> dict:
+    """
+    Options for ``send_task``/``signature.set`` binding a task to an absolute deadline.
+
+    The message expires at the deadline (``expires`` header only, see ``strip_message_expiration``) and the
+    execution is bounded by the time remaining at publication.
+    """
+    remaining = max(seconds_until(deadline), 0.0)
+    return {
+        'expires': deadline,
+        'soft_time_limit': remaining,
+        'time_limit': remaining + HARD_TIME_LIMIT_GRACE_SECONDS,
+    }
+
+
+def strip_message_expiration(properties: dict, **kwargs) -> None:
+    """
+    ``before_task_publish`` handler removing the AMQP ``expiration`` Celery derives from ``expires``.
+
+    The task queues dead-letter the messages RabbitMQ expires: the deadline must only travel in the ``expires``
+    header, checked by the workers (``deadline_strategy``), so that stale messages are dropped, not dead-lettered.
+    """
+    properties.pop('expiration', None)
+
+
+def message_expired(headers: dict | None) -> bool:
+    expires = (headers or {}).get('expires')
+    if not expires:
+        return False
+    return maybe_make_aware(maybe_iso8601(expires)) <= datetime.now(timezone.utc)
+
+
+def deadline_strategy(task, app, consumer, **kwargs) -> Any:
+    """
+    Task execution strategy discarding expired messages.
+
+    Celery's default strategy decodes the payload before checking ``expires`` and stores a ``REVOKED`` result
+    for every expired task. After an outage this means decoding and writing the whole backlog nobody is
+    waiting for anymore: here expired messages are acknowledged and dropped by looking at the headers only.
+    """
+    handle = default_strategy(task, app, consumer, **kwargs)
+    connection_errors = consumer.connection_errors
+
+    def task_message_handler(message, body, ack, reject, callbacks, **kw):
+        if message_expired(message.headers):
+            TASKS_EXPIRED_DROPPED.labels(task=task.name).inc()
+            logger.info('Dropping expired task: %s[%s]', task.name, message.headers.get('id'))
+            ack(logger, connection_errors)
+            return None
+        return handle(message, body, ack, reject, callbacks, **kw)
+
+    return task_message_handler
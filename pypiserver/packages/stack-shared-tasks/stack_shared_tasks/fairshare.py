@@ -0,0 +1,68 @@
+import math
+import threading
+import time
+from typing import Callable
+
+# Message header carrying the tenant (user) a task was submitted by
+TENANT_HEADER = 'tenant'
+
+# Traffic lanes, lowest priority first: each lane has its own band of priorities
+LANES = ('bulk', 'interactive')
+
+
+class FairShare:
+    """
+    Per-tenant token buckets mapping the submissions of each tenant to a message priority.
+
+    Each tenant earns ``rate`` tasks per second, up to ``burst``. Tasks submitted within the share of the tenant
+    get the highest priority (``levels - 1``); every ``burst`` tasks of debt beyond it costs one priority level,
+    down to ``0``. Queues declared with ``x-max-priority`` then serve the light tenants first, whatever the backlog
+    the heavy ones queued.
+    """
+
+    def __init__(
+            self,
+            rate: float = 10.0,
+            burst: float = 100.0,
+            levels: int = 5,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.levels = levels
+        self.clock = clock
+        # Debt is capped so that a tenant gets back to the highest priority after levels * burst / rate seconds
+        self.max_debt = levels * burst
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _tokens(self, tenant: str, now: float) -> float:
+        tokens, last = self._buckets.get(tenant, (self.burst, now))
+        return min(self.burst, tokens + (now - last) * self.rate)
+
+    def priority(self, tenant: str, cost: float = 1.0) -> int:
+        """
+        Charge ``cost`` tasks to the tenant and return the priority of its submission.
+        """
+        with self._lock:
+            now = self.clock()
+            tokens = max(-self.max_debt, self._tokens(tenant, now) - cost)
+            self._buckets[tenant] = (tokens, now)
+        if tokens >= 0:
+            return self.levels - 1
+        return max(0, self.levels - 1 - math.ceil(-tokens / self.burst))
+
+
+def lane_priority(lane: str, level: int, levels: int) -> int:
+    """
+    Priority of a submission of fair-share ``level`` (``0`` ... ``levels - 1``) in a lane: any interactive
+    submission comes before any bulk one, the fair share orders the submissions within a lane.
+    """
+    return LANES.index(lane) * levels + level
+
+
+def fair_share_options(tenant: str, priority: int) -> dict:
+    """
+    Options for ``send_task``/``signature.set`` tagging a task with its tenant and fair-share priority.
+    """
+    return {'priority': priority, 'headers': {TENANT_HEADER: tenant}}
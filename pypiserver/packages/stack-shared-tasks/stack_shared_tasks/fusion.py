@@ -0,0 +1,79 @@
+import logging
+import sys
+from typing import Any
+
+from celery import Task
+from celery.app.task import Context
+
+from .deadlines import message_expired
+from .metrics import TASKS_CHAIN_LINKS_FUSED
+from .routing import AFFINITY_KEY_HEADER
+
+logger = logging.getLogger(__name__)
+
+
+def _link_request(task: Task, link: dict, args: tuple) -> Context:
+    # Request stored with the result of a fused link (name, args... with result_extended)
+    options = link.get('options', {})
+    return Context(
+        id=options['task_id'],
+        task=link['task'],
+        args=args,
+        kwargs=link.get('kwargs', {}),
+        parent_id=task.request.id,
+        root_id=task.request.root_id,
+        hostname=task.request.hostname,
+        delivery_info=task.request.delivery_info,
+    )
+
+
+def fusible(task: Task, link: dict) -> bool:
+    """
+    Whether the next link of a chain can run in the current process: it is a plain task registered locally,
+    routed to a queue this worker consumes, not expired and without callbacks of its own.
+    """
+    options = link.get('options', {})
+    if link.get('subtask_type') or link['task'] not in task.app.tasks or 'task_id' not in options:
+        return False
+    if options.get('link') or options.get('link_error') or options.get('chord'):
+        return False
+    if message_expired(options):
+        return False
+    consumed = task.app.amqp.queues.consume_from
+    if AFFINITY_KEY_HEADER not in (options.get('headers') or {}):
+        # Any of the queues able to serve the task will do, whatever the current load
+        if set(task.app.conf.get('task_eligible_queues', {}).get(link['task'], ())) & set(consumed):
+            return True
+    route = task.app.amqp.router.route(dict(options), link['task'], link.get('args', ()), link.get('kwargs'))
+    return route['queue'].name in consumed
+
+
+def run_fused_links(task: Task, retval: Any, max_links: int) -> Any:
+    """
+    Run in-process the next links of the chain of the current request, up to ``max_links`` of them, instead of
+    publishing each one to the broker and storing each intermediate result.
+
+    Only the result of the last fused link is stored (the checkpoint the client or the next hop reads);
+    the remaining links of the chain are published by the tracer as usual.
+    """
+    chain = task.request.chain
+    fused = 0
+    while chain and fused < max_links and fusible(task, chain[-1]):
+        link = chain.pop()
+        args = tuple(link.get('args', ())) if link.get('immutable') else (retval, *link.get('args', ()))
+        request = _link_request(task, link, args)
+        try:
+            # Task.__call__ rather than the task itself: a fused link must not fuse the chain again
+            retval = Task.__call__(task.app.tasks[link['task']], *args, **link.get('kwargs', {}))
+        except Exception as exc:
+            # The client waits on the last link of the chain: fail it like the tracer would have
+            task.backend.mark_as_failure(request.id, exc, sys.exc_info()[2], request=request)
+            raise
+        fused += 1
+    if fused:
+        TASKS_CHAIN_LINKS_FUSED.labels(task=task.name).inc(fused)
+        # The intermediate result of the first link is not stored, the checkpoint is stored under the last link
+        task.request.ignore_result = True
+        task.backend.mark_as_done(request.id, retval, request=request)
+        logger.debug('Fused %d links of the chain of %s[%s]', fused, task.name, task.request.id)
+    return retval
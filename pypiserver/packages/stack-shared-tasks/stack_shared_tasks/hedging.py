@@ -0,0 +1,119 @@
+import collections
+import threading
+import time
+from typing import Any, Callable
+
+from celery.exceptions import TimeoutError
+from celery.result import AsyncResult
+
+from .metrics import TASKS_HEDGES, TASKS_HEDGES_DENIED
+from .retries import RetryBudget
+
+# Interval of AsyncResult.get, for the backends without a subpolling_interval
+DEFAULT_POLL_INTERVAL = 0.5
+
+
+class LatencyTracker:
+    """
+    Completion latencies of the last ``window`` executions of each task.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._samples: dict[str, collections.deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, task_name: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(task_name, collections.deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, task_name: str, percentile: float, min_samples: int = 1) -> float | None:
+        """
+        ``percentile`` (0-100) of the recorded latencies, ``None`` with fewer than ``min_samples`` samples.
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(task_name, ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        return samples[round(percentile / 100 * (len(samples) - 1))]
+
+
+class Hedger:
+    """
+    Hedged execution of idempotent tasks: when a task has not completed by the ``percentile`` of its latency,
+    a duplicate is sent and the first of the two results wins; the other task is revoked.
+
+    Duplicates are capped by a global budget: each task deposits ``budget_ratio`` tokens and each duplicate
+    withdraws one, so hedging adds at most ``budget_ratio`` to the executions.
+
+    The results are polled every ``poll_interval`` seconds at first, then with an interval doubling up to the polling
+    interval of the result backend. Latencies are measured from the first send, hedged or not.
+    """
+
+    def __init__(
+            self,
+            percentile: float = 95.0,
+            min_delay: float = 0.05,
+            min_samples: int = 20,
+            budget_ratio: float = 0.05,
+            poll_interval: float = 0.05,
+    ):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.poll_interval = poll_interval
+        self.latencies = LatencyTracker()
+        self.budget = RetryBudget(ratio=budget_ratio, min_per_second=0.0, max_tokens=100 * budget_ratio)
+
+    def hedge_delay(self, task_name: str) -> float | None:
+        """
+        Seconds after which a duplicate of the task is sent, ``None`` until enough latencies are known.
+        """
+        latency = self.latencies.percentile(task_name, self.percentile, self.min_samples)
+        return None if latency is None else max(self.min_delay, latency)
+
+    def _first_ready(self, results: list[AsyncResult], timeout: float) -> AsyncResult:
+        stop = time.monotonic() + timeout
+        max_interval = getattr(results[0].backend, 'subpolling_interval', None) or DEFAULT_POLL_INTERVAL
+        interval = min(self.poll_interval, max_interval)
+        while True:
+            for result in results:
+                if result.ready():
+                    return result
+            if time.monotonic() >= stop:
+                raise TimeoutError()
+            time.sleep(min(interval, max(0.0, stop - time.monotonic())))
+            interval = min(2 * interval, max_interval)
+
+    def run(
+            self,
+            task_name: str,
+            send: Callable[[], AsyncResult],
+            hedge: Callable[[], AsyncResult],
+            timeout: float,
+    ) -> Any:
+        """
+        Send the task with ``send`` and wait at most ``timeout`` seconds for its result, sending a duplicate
+        with ``hedge`` when it is late. Raises ``celery.exceptions.TimeoutError`` like ``AsyncResult.get``.
+        """
+        start = time.monotonic()
+        self.budget.deposit()
+        results = [send()]
+        delay = self.hedge_delay(task_name)
+        if delay is not None and delay < timeout:
+            try:
+                results = [self._first_ready(results, delay)]
+            except TimeoutError:
+                if self.budget.withdraw():
+                    TASKS_HEDGES.labels(task=task_name).inc()
+                    results.append(hedge())
+                else:
+                    TASKS_HEDGES_DENIED.labels(task=task_name).inc()
+        winner = self._first_ready(results, timeout - (time.monotonic() - start))
+        # The latency seen by the caller: a hedge winning does not hide the delay before it was sent
+        self.latencies.record(task_name, time.monotonic() - start)
+        for result in results:
+            if result is not winner:
+                # The duplicate may still run (e.g. already started): its result is simply ignored
+                result.revoke()
+        return winner.get(timeout=max(0.0, timeout - (time.monotonic() - start)))
@@ -0,0 +1,102 @@
+import logging
+import os
+import resource
+import tracemalloc
+
+from celery import Task
+
+from .metrics import TASKS_MEMORY_GROWTH, TASKS_MEMORY_RECYCLES, WORKER_CHILD_RSS
+
+logger = logging.getLogger(__name__)
+
+
+def rss_kb() -> int:
+    """
+    Current resident memory of the process, in kilobytes.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except OSError:
+        # Not Linux: the peak is the best approximation available
+        return peak_rss_kb()
+
+
+def peak_rss_kb() -> int:
+    """
+    Peak resident memory of the process, in kilobytes: what the pool compares to ``worker_max_memory_per_child``.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class MemoryGovernor:
+    """
+    Attribute the memory growth of a worker process to the tasks it runs.
+
+    The resident memory is sampled before and after each task: the growth is charged to the task name
+    (``celery_task_memory_growth_kilobytes_total``), the tasks growing it by more than ``growth_warning`` kilobytes
+    are logged (with their top allocators when ``track_allocations`` is set, using tracemalloc), and the task after which the process
+    crossed ``worker_max_memory_per_child`` is counted in ``celery_worker_child_recycles_total``. The pool replaces
+    such processes once the task completed, the next task starts in a fresh process.
+
+    Samples are kept per task id, so that tasks running concurrently in a process (``threads`` pool) are each
+    charged from their own start. Growth is still measured per process: it is only attributed exactly with the
+    prefork pool, where a process runs one task at a time.
+    """
+
+    def __init__(
+            self,
+            max_memory_kb: int | None,
+            growth_warning: int,
+            track_allocations: bool = False,
+            top: int = 5,
+    ):
+        self.max_memory_kb = max_memory_kb
+        self.growth_warning = growth_warning
+        self.track_allocations = track_allocations
+        self.top = top
+        # Samples taken before the running tasks, by task id
+        self._before: dict[str, tuple[int, tracemalloc.Snapshot | None]] = {}
+        # Only the processes of the prefork pool are replaced
+        self._pool_child = False
+
+    def on_process_init(self) -> None:
+        self._pool_child = True
+        WORKER_CHILD_RSS.set(rss_kb() * 1024)
+
+    def before_task(self, task_id: str) -> None:
+        if self.track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        self._before[task_id] = (rss_kb(), snapshot)
+
+    def after_task(self, task: Task, task_id: str) -> None:
+        sample = self._before.pop(task_id, None)
+        if sample is None:
+            return
+        before, snapshot = sample
+        after = rss_kb()
+        WORKER_CHILD_RSS.set(after * 1024)
+        growth = after - before
+        if growth > 0:
+            TASKS_MEMORY_GROWTH.labels(task=task.name).inc(growth)
+        if growth > self.growth_warning:
+            logger.warning(
+                'Task %s[%s] grew the process by %d kB (%d kB)%s',
+                task.name, task.request.id, growth, after, self.top_allocators(snapshot),
+            )
+        if self._pool_child and self.max_memory_kb and peak_rss_kb() > self.max_memory_kb:
+            TASKS_MEMORY_RECYCLES.labels(task=task.name).inc()
+            logger.warning(
+                'Process %d exceeds %d kB after task %s, it will be replaced',
+                os.getpid(), self.max_memory_kb, task.name,
+            )
+
+    def top_allocators(self, before: tracemalloc.Snapshot | None) -> str:
+        if before is None:
+            return ''
+        stats = tracemalloc.take_snapshot().compare_to(before, 'lineno')
+        return ''.join(
+            f'\n  {stat.size_diff // 1024:+d} kB in {stat.count_diff:+d} blocks at {stat.traceback[-1]}'
+            for stat in stats[:self.top]
+        )
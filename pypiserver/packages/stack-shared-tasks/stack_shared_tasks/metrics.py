@@ -0,0 +1,169 @@
+import os
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, multiprocess, start_http_server
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def get_registry() -> CollectorRegistry:
+    """
+    Registry to expose. When ``PROMETHEUS_MULTIPROC_DIR`` is set (prefork workers, multiple uvicorn workers)
+    the metrics of all the processes are aggregated.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def start_metrics_server(port: int) -> None:
+    start_http_server(port, registry=get_registry())
+
+
+TASKS_EXPIRED_DROPPED = Counter(
+    'celery_tasks_expired_dropped_total',
+    'Task messages discarded by the worker because their deadline had passed',
+    ['task'],
+)
+
+TASKS_RETRIES = Counter(
+    'celery_tasks_retries_total',
+    'Retries scheduled by the shared retry policy',
+    ['task'],
+)
+
+TASKS_RETRY_BUDGET_EXHAUSTED = Counter(
+    'celery_tasks_retry_budget_exhausted_total',
+    'Failures not retried because the retry budget of the task was exhausted',
+    ['task'],
+)
+
+TASKS_DEAD_LETTERS_REPLAYED = Counter(
+    'celery_dead_letters_replayed_total',
+    'Dead-lettered messages re-published by the replay tool',
+    ['queue'],
+)
+
+TASKS_HEDGES = Counter(
+    'celery_tasks_hedges_total',
+    'Duplicates sent for tasks that had not completed by their hedging delay',
+    ['task'],
+)
+
+TASKS_HEDGES_DENIED = Counter(
+    'celery_tasks_hedges_denied_total',
+    'Duplicates not sent because the hedging budget was exhausted',
+    ['task'],
+)
+
+TASKS_CHAIN_LINKS_FUSED = Counter(
+    'celery_chain_links_fused_total',
+    'Chain links executed in the process of the previous link instead of being published',
+    ['task'],
+)
+
+RESULTS_FLUSH_SIZE = Histogram(
+    'celery_results_flush_size',
+    'Results written by each batch of the result backend',
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+
+RESULTS_FLUSH_SECONDS = Histogram(
+    'celery_results_flush_seconds',
+    'Duration of the writes of the batches of results',
+)
+
+TASKS_MEMORY_GROWTH = Counter(
+    'celery_task_memory_growth_kilobytes_total',
+    'Growth of the resident memory of the worker processes over the tasks, by task',
+    ['task'],
+)
+
+TASKS_MEMORY_RECYCLES = Counter(
+    'celery_worker_child_recycles_total',
+    'Worker processes replaced for exceeding worker_max_memory_per_child, by task after which they did',
+    ['task'],
+)
+
+WORKER_CHILD_RSS = Gauge(
+    'celery_worker_child_rss_bytes',
+    'Resident memory of the worker processes after their last task',
+    multiprocess_mode='liveall',
+)
+
+DB_POOL_SIZE = Gauge(
+    'db_pool_size',
+    'Connections the pool keeps open, overflow included',
+    ['pool'],
+    multiprocess_mode='livesum',
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    'db_pool_checked_out',
+    'Connections of the pool in use',
+    ['pool'],
+    multiprocess_mode='livesum',
+)
+
+DB_SESSIONS = Counter(
+    'db_sessions_total',
+    'Database sessions opened for the requests, by route',
+    ['route'],
+)
+
+DB_SESSIONS_UNUSED = Counter(
+    'db_sessions_unused_total',
+    'Database sessions opened for the requests that never checked out a connection, by route',
+    ['route'],
+)
+
+AUTH_USER_CACHE = Counter(
+    'auth_user_cache_total',
+    'Lookups of the users resolved by the authentication in the cache of the process, by result (hit or miss)',
+    ['result'],
+)
+
+PASSWORD_HASHING_PENDING = Gauge(
+    'password_hashing_pending',
+    'Password hashes and verifications waiting for or running in the pool of hashing processes',
+    multiprocess_mode='livesum',
+)
+
+PASSWORD_HASHING_WAIT_SECONDS = Histogram(
+    'password_hashing_wait_seconds',
+    'Time the password hashes and verifications waited for a process of the pool',
+)
+
+PASSWORD_HASHING_SECONDS = Histogram(
+    'password_hashing_seconds',
+    'Duration of the password hashes and verifications in the pool, by operation (hash or verify)',
+    ['operation'],
+)
+
+PASSWORD_HASHING_SHED = Counter(
+    'password_hashing_shed_total',
+    'Password hashes and verifications refused because too many were pending, by operation',
+    ['operation'],
+)
+
+ITEMS_IMPORT_ROWS = Counter(
+    'items_import_rows_total',
+    'Rows read by the item imports, by outcome (imported or rejected)',
+    ['outcome'],
+)
+
+
+def instrument_pool(engine: Engine, pool: str) -> None:
+    """
+    Track the utilisation of the connection pool of an engine under the ``pool`` label.
+    """
+    DB_POOL_SIZE.labels(pool=pool).inc(engine.pool.size() + getattr(engine.pool, '_max_overflow', 0))
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(*args) -> None:
+        DB_POOL_CHECKED_OUT.labels(pool=pool).inc()
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(*args) -> None:
+        DB_POOL_CHECKED_OUT.labels(pool=pool).dec()
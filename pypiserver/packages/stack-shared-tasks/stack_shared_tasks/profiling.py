@@ -0,0 +1,100 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+
+from celery import Task
+from sqlmodel import Session
+
+from stack_datamodel import TaskProfile
+
+# Message header requesting the profile of a task
+PROFILE_HEADER = 'profile'
+
+
+def profile_options() -> dict:
+    """
+    Options for ``send_task``/``signature.set`` requesting the profile of a task.
+    """
+    return {'headers': {PROFILE_HEADER: True}}
+
+
+def profiling_requested(task: Task) -> bool:
+    """
+    Whether the task being executed must be profiled: requested by its submitter or sampled with
+    ``task_profile_sample_rate``.
+    """
+    if task.request.get(PROFILE_HEADER):
+        return True
+    rate = task.app.conf.get('task_profile_sample_rate') or 0.0
+    return rate > 0 and random.random() < rate
+
+
+def frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class StackSampler:
+    """
+    Statistical profiler of one thread: a background thread samples its stack every ``interval`` seconds.
+
+    Stacks are recorded below ``root`` (the frame the profiling started in) and counted in the collapsed format
+    of flame graph tools: one ``outer;...;inner count`` line per distinct stack.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _sample(self, thread_id: int, root: FrameType) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            names = []
+            while frame is not None and frame is not root:
+                names.append(frame_name(frame))
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def __enter__(self) -> 'StackSampler':
+        self._start = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._sample,
+            args=(threading.get_ident(), sys._getframe(1)),
+            name='task-profiler',
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.monotonic() - self._start
+
+    def collapsed(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def store_profile(task: Task, sampler: StackSampler) -> None:
+    """
+    Store the profile of the task being executed under its id.
+    """
+    with Session(bind=task.backend.engine) as session:
+        session.merge(
+            TaskProfile(
+                task_id=task.request.id,
+                task_name=task.name,
+                duration=sampler.duration,
+                samples=sum(sampler.stacks.values()),
+                stacks=sampler.collapsed(),
+            )
+        )
+        session.commit()
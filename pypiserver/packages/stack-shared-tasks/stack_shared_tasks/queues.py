@@ -0,0 +1,65 @@
+from celery import Celery
+from kombu import Exchange, Queue
+
+from stack_settings import CeleryConfig
+
+from .routing import shard_queue_name
+
+# Exchange receiving the messages rejected by the workers (failed tasks once retries are exhausted)
+DEAD_LETTER_EXCHANGE = Exchange('dead-letter', type='direct', durable=True)
+
+
+def dead_letter_queue_name(queue: str) -> str:
+    return f'{queue}.dlq'
+
+
+def logical_queues(celery_config: CeleryConfig) -> list[str]:
+    """
+    Queues the tasks can be routed to, before sharding.
+    """
+    queues = {celery_config.task_default_queue}
+    queues.update(route['queue'] for route in celery_config.task_routes.values())
+    for eligible in celery_config.task_eligible_queues.values():
+        queues.update(eligible)
+    return sorted(queues)
+
+
+def task_queue(name: str, logical_queue: str) -> Queue:
+    # Same exchange and routing key as the queues Celery creates on the fly (task_create_missing_queues)
+    return Queue(
+        name,
+        Exchange(name, type='direct'),
+        routing_key=name,
+        queue_arguments={
+            'x-dead-letter-exchange': DEAD_LETTER_EXCHANGE.name,
+            'x-dead-letter-routing-key': dead_letter_queue_name(logical_queue),
+        },
+    )
+
+
+def task_queues(celery_config: CeleryConfig) -> list[Queue]:
+    """
+    Declarations of every queue the tasks can be routed to, shards included, dead-lettering to ``<queue>.dlq``.
+    """
+    queues = []
+    for queue in logical_queues(celery_config):
+        queues.append(task_queue(queue, queue))
+        n_shards = celery_config.task_queue_shards.get(queue, 1)
+        if n_shards > 1:
+            queues.extend(task_queue(shard_queue_name(queue, shard), queue) for shard in range(n_shards))
+    return queues
+
+
+def dead_letter_queue(queue: str) -> Queue:
+    return Queue(dead_letter_queue_name(queue), DEAD_LETTER_EXCHANGE, routing_key=dead_letter_queue_name(queue))
+
+
+def configure_queues(app: Celery, celery_config: CeleryConfig) -> None:
+    app.conf.task_queues = task_queues(celery_config)
+
+
+def declare_dead_letter_queues(app: Celery, celery_config: CeleryConfig) -> None:
+    # Dead-lettered messages are dropped by the broker when their queue does not exist
+    with app.connection_for_write() as connection:
+        for queue in logical_queues(celery_config):
+            dead_letter_queue(queue)(connection.default_channel).declare()
@@ -0,0 +1,88 @@
+"""
+Re-publish dead-lettered task messages at a controlled rate.
+
+Example, from a worker container::
+
+    python -m stack_shared_tasks.replay worker.main:app alpha --rate 5 --limit 1000
+"""
+import argparse
+import logging
+import time
+
+from celery import Celery
+from celery.contrib.migrate import republish
+from kombu.common import maybe_declare
+from kombu.utils.imports import symbol_by_name
+
+from .metrics import TASKS_DEAD_LETTERS_REPLAYED
+from .queues import dead_letter_queue, dead_letter_queue_name
+
+logger = logging.getLogger(__name__)
+
+# Headers added by the broker when dead-lettering
+DEAD_LETTER_HEADERS = ('x-death', 'x-first-death-exchange', 'x-first-death-queue', 'x-first-death-reason')
+DEADLINE_HEADERS = ('expires', 'timelimit')
+
+
+def replay_dead_letters(
+        app: Celery,
+        queue: str,
+        rate: float = 10.0,
+        limit: int | None = None,
+        strip_deadline: bool = False,
+) -> int:
+    """
+    Move up to ``limit`` messages from ``<queue>.dlq`` back to the queue the router sends them to,
+    at most ``rate`` messages per second. Returns the number of replayed messages.
+
+    Messages keep their deadline unless ``strip_deadline`` is set: the expired ones are dropped again by the workers.
+    """
+    replayed = 0
+    source = dead_letter_queue(queue)
+    with app.connection_for_write() as connection:
+        channel = connection.default_channel
+        producer = app.amqp.Producer(connection)
+        while limit is None or replayed < limit:
+            message = source(channel).get(no_ack=False)
+            if message is None:
+                break
+            for header in DEAD_LETTER_HEADERS + (DEADLINE_HEADERS if strip_deadline else ()):
+                message.headers.pop(header, None)
+            destination = app.amqp.router.route({'headers': message.headers}, message.headers['task'])['queue']
+            maybe_declare(destination, channel)
+            republish(producer, message, exchange=destination.exchange.name, routing_key=destination.routing_key)
+            message.ack()
+            replayed += 1
+            TASKS_DEAD_LETTERS_REPLAYED.labels(queue=queue).inc()
+            time.sleep(1.0 / rate)
+    logger.info('Replayed %d messages from %s', replayed, dead_letter_queue_name(queue))
+    return replayed
+
+
+def positive_rate(value: str) -> float:
+    rate = float(value)
+    if not rate > 0:
+        raise argparse.ArgumentTypeError(f'the rate must be positive, got {value}')
+    return rate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('app', help='Celery application, e.g. worker.main:app')
+    parser.add_argument('queue', help='Queue whose dead letters are replayed, e.g. alpha')
+    parser.add_argument('--rate', type=positive_rate, default=10.0, help='Messages per second')
+    parser.add_argument('--limit', type=int, default=None, help='Maximum number of messages')
+    parser.add_argument('--strip-deadline', action='store_true', help='Remove the expiry and time limits')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    replay_dead_letters(
+        symbol_by_name(args.app),
+        args.queue,
+        rate=args.rate,
+        limit=args.limit,
+        strip_deadline=args.strip_deadline,
+    )
+
+
+if __name__ == '__main__':
+    main()
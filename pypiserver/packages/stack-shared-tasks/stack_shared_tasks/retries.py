@@ -0,0 +1,129 @@
+import functools
+import random
+import threading
+import time
+from typing import Callable
+
+from celery import Celery, Task
+from celery.exceptions import Reject
+from celery.utils.time import get_exponential_backoff_interval
+from sqlalchemy.exc import OperationalError
+
+from stack_settings import CeleryConfig
+
+from .metrics import TASKS_RETRIES, TASKS_RETRY_BUDGET_EXHAUSTED
+
+# Failures worth retrying: the dependencies of the task (database, network) being unavailable for a while
+TRANSIENT_ERRORS: tuple[type[BaseException], ...] = (ConnectionError, TimeoutError, OperationalError)
+
+
+class RetryBudget:
+    """
+    Bounds the retries of a task to a fraction of its executions.
+
+    Every execution deposits ``ratio`` tokens and every retry withdraws one; ``min_per_second`` tokens are
+    refilled regardless of the traffic so that low traffic tasks can still retry. When a dependency is down
+    this caps the extra load the retries add on it, instead of multiplying it by ``max_retries``.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, max_tokens: float = 100.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, tokens: float) -> None:
+        now = time.monotonic()
+        tokens += (now - self._last_refill) * self.min_per_second
+        self._last_refill = now
+        self._tokens = min(self.max_tokens, self._tokens + tokens)
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._refill(self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            self._refill(0.0)
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+
+def dead_letter(task: Task, exc: BaseException) -> None:
+    """
+    Give up on a task whose retries are exhausted. Tasks opting into dead-lettering (``dead_letter=True`` in their
+    options, acknowledged late) store their failure and have their message rejected, which dead-letters it to
+    ``<queue>.dlq``. For the other tasks this returns: they fail as usual.
+    """
+    if not (getattr(task, 'dead_letter', False) and task.acks_late):
+        return
+    task.backend.mark_as_failure(task.request.id, exc, request=task.request)
+    raise Reject(exc, requeue=False) from exc
+
+
+def with_retries(
+        retry_on: tuple[type[BaseException], ...] = TRANSIENT_ERRORS,
+        max_retries: int = 5,
+        backoff: int = 1,
+        backoff_max: int = 600,
+        budget: RetryBudget | None = None,
+) -> Callable:
+    """
+    Retry a bound task on the given exceptions with exponential backoff and full jitter.
+
+    Retries are bounded by ``max_retries`` and by the retry budget of the task (one budget per task and process
+    unless one is given). Once they are exhausted the exception propagates and the task fails; the message of the
+    tasks declared with ``dead_letter=True`` is dead-lettered (see ``dead_letter``). Other exceptions (e.g. invalid
+    payloads) and time limits fail the task without retry nor dead-lettering.
+
+    Example::
+
+        @app.task(bind=True, name='fetch', dead_letter=True)
+        @with_retries(retry_on=(ConnectionError,), max_retries=3)
+        def fetch(self, url): ...
+    """
+
+    def decorator(fun: Callable) -> Callable:
+        task_budget = budget or RetryBudget()
+
+        @functools.wraps(fun)
+        def wrapper(self, *args, **kwargs):
+            task_budget.deposit()
+            try:
+                return fun(self, *args, **kwargs)
+            except retry_on as exc:
+                if self.request.retries >= max_retries:
+                    dead_letter(self, exc)
+                    raise
+                if not task_budget.withdraw():
+                    TASKS_RETRY_BUDGET_EXHAUSTED.labels(task=self.name).inc()
+                    dead_letter(self, exc)
+                    raise
+                TASKS_RETRIES.labels(task=self.name).inc()
+                countdown = get_exponential_backoff_interval(backoff, self.request.retries, backoff_max, True)
+                raise self.retry(exc=exc, countdown=countdown, max_retries=max_retries)
+
+        return wrapper
+
+    return decorator
+
+
+def publish_retry_policy(interval_step: float = 0.2, interval_max: float = 1.0, max_retries: int = 3) -> dict:
+    """
+    ``task_publish_retry_policy`` with a random first interval, so that the processes reconnecting after a
+    broker restart do not retry in lockstep.
+    """
+    return {
+        'max_retries': max_retries,
+        'interval_start': random.uniform(0, interval_step),
+        'interval_step': interval_step,
+        'interval_max': interval_max,
+    }
+
+
+def configure_retries(app: Celery, celery_config: CeleryConfig) -> None:
+    app.conf.task_publish_retry_policy = publish_retry_policy(**celery_config.task_publish_retry_policy)
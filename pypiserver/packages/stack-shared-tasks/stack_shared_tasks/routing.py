@@ -0,0 +1,225 @@
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+
+from celery import Celery
+from celery.contrib.migrate import move
+
+from stack_settings import CeleryConfig
+
+logger = logging.getLogger(__name__)
+
+# Message header carrying the affinity key of a task (e.g. a dataset or user id)
+AFFINITY_KEY_HEADER = 'affinity_key'
+
+
+def jump_consistent_hash(key: int, num_buckets: int) -> int:
+    """
+    Jump consistent hash (Lamping & Veach): going from n to n + 1 buckets only moves 1 / (n + 1) of the keys.
+    """
+    b, j = -1, 0
+    while j < num_buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+def shard_for_key(affinity_key: str, n_shards: int) -> int:
+    # Python's hash() is salted per process: the API and the workers must agree on the shard
+    digest = hashlib.blake2b(affinity_key.encode(), digest_size=8).digest()
+    return jump_consistent_hash(int.from_bytes(digest, 'big'), n_shards)
+
+
+def shard_queue_name(queue: str, shard: int) -> str:
+    return f'{queue}.{shard}'
+
+
+def affinity_options(affinity_key: str | None) -> dict:
+    """
+    Options for ``send_task``/``signature.set`` routing a task by its affinity key.
+    """
+    if affinity_key is None:
+        return {}
+    return {'headers': {AFFINITY_KEY_HEADER: affinity_key}}
+
+
+class QueueStats:
+    """
+    Depth and number of consumers of a set of queues, sampled periodically by a background thread.
+
+    The thread is started on first use in each process, so that it survives the fork of the pool processes.
+    """
+
+    def __init__(self, app: Celery, queues: set[str], interval: float):
+        self.app = app
+        self.queues = queues
+        self.interval = interval
+        self._samples: dict[str, tuple[float, int, int]] = {}
+        self._lock = threading.Lock()
+        self._pid: int | None = None
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._samples = {}
+                threading.Thread(target=self._run, name='queue-stats', daemon=True).start()
+                self._pid = os.getpid()
+
+    def _sample(self, connection) -> None:
+        for queue in self.queues:
+            channel = connection.channel()
+            try:
+                _, messages, consumers = channel.queue_declare(queue, passive=True)
+            except connection.channel_errors:
+                # Not declared yet: nobody consumes from it
+                messages, consumers = 0, 0
+            finally:
+                channel.close()
+            self._samples[queue] = (time.monotonic(), messages, consumers)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                with self.app.connection_for_read() as connection:
+                    while True:
+                        self._sample(connection)
+                        time.sleep(self.interval)
+            except Exception:
+                logger.warning('Sampling of the queue stats failed', exc_info=True)
+                time.sleep(self.interval)
+
+    def load(self, queue: str, max_age: float) -> float | None:
+        """
+        Messages waiting per consumer, ``None`` when no fresh sample is available.
+        """
+        self._ensure_started()
+        sample = self._samples.get(queue)
+        if sample is None or time.monotonic() - sample[0] > max_age:
+            return None
+        _, messages, consumers = sample
+        return messages / consumers if consumers else math.inf
+
+
+class TaskRouter:
+    """
+    Celery router resolving the queue of a task.
+
+    Tasks carrying an affinity key are consistently hashed onto the shards of their queue in the static
+    ``task_routes`` map, so that tasks sharing inputs hit the same workers and their per-process caches.
+    Tasks that several queues can serve (``task_eligible_queues``) go to the least loaded of them; the static
+    map is the fallback when the queue stats are stale.
+    """
+
+    def __init__(
+            self,
+            routes: dict[str, dict],
+            shards: dict[str, int],
+            eligible_queues: dict[str, list[str]] | None = None,
+            stats: QueueStats | None = None,
+            stats_max_age: float = 10.0,
+    ):
+        self.routes = routes
+        self.shards = shards
+        self.eligible_queues = eligible_queues or {}
+        self.stats = stats
+        self.stats_max_age = stats_max_age
+
+    def least_loaded(self, queues: list[str]) -> str | None:
+        loads = [self.stats.load(queue, self.stats_max_age) for queue in queues]
+        if any(load is None for load in loads):
+            return None
+        # min() keeps the first of equally loaded queues: list the static queue first
+        load, queue = min(zip(loads, queues), key=lambda load_queue: load_queue[0])
+        return queue if load != math.inf else None
+
+    def __call__(self, name, args, kwargs, options, task=None, **kw) -> dict | None:
+        route = self.routes.get(name)
+        if route is None:
+            return None
+        # Celery pops the queue out of the returned route: always hand out a copy
+        route = dict(route)
+        affinity_key = (options.get('headers') or {}).get(AFFINITY_KEY_HEADER)
+        n_shards = self.shards.get(route['queue'], 1)
+        if affinity_key is not None and n_shards > 1:
+            route['queue'] = shard_queue_name(route['queue'], shard_for_key(str(affinity_key), n_shards))
+        elif affinity_key is None and self.stats is not None and name in self.eligible_queues:
+            route['queue'] = self.least_loaded(self.eligible_queues[name]) or route['queue']
+        return route
+
+
+def configure_routing(app: Celery, celery_config: CeleryConfig) -> None:
+    # Must run before the first task is sent: the router is built lazily from the configuration
+    stats = None
+    if celery_config.task_eligible_queues:
+        stats = QueueStats(
+            app,
+            {queue for queues in celery_config.task_eligible_queues.values() for queue in queues},
+            celery_config.task_queue_stats_interval,
+        )
+    app.conf.task_routes = (
+        TaskRouter(
+            celery_config.task_routes,
+            celery_config.task_queue_shards,
+            eligible_queues=celery_config.task_eligible_queues,
+            stats=stats,
+            stats_max_age=celery_config.task_queue_stats_max_age,
+        ),
+    )
+
+
+def worker_shards(queues: list[str], shards: dict[str, int], replica_index: int, replicas: int) -> list[str]:
+    """
+    Shards consumed by a worker replica: shard ``i`` of a queue goes to replica ``i % replicas``.
+    """
+    selected = []
+    for queue in queues:
+        n_shards = shards.get(queue, 1)
+        if n_shards > 1:
+            selected.extend(
+                shard_queue_name(queue, shard) for shard in range(n_shards) if shard % replicas == replica_index
+            )
+    return selected
+
+
+def _queue_exists(app: Celery, name: str) -> bool:
+    with app.connection_for_write() as connection:
+        channel = connection.channel()
+        try:
+            channel.queue_declare(name, passive=True)
+        except connection.channel_errors:
+            return False
+        finally:
+            channel.close()
+    return True
+
+
+def rebalance_shards(app: Celery, queue: str, n_shards: int) -> int:
+    """
+    Move the messages left in the retired shards of a queue (after its shard count was reduced)
+    to the shards they are now routed to.
+
+    Messages are re-routed through the application router, which must be configured with the new shard counts.
+    Returns the number of moved messages.
+    """
+    retired = []
+    # A queue brought back to a single shard is not sharded anymore: all of its shards are retired
+    shard = n_shards if n_shards > 1 else 0
+    while _queue_exists(app, shard_queue_name(queue, shard)):
+        retired.append(shard_queue_name(queue, shard))
+        shard += 1
+    if not retired:
+        return 0
+
+    def destination(body, message):
+        headers = message.headers or {}
+        return app.amqp.router.route({'headers': headers}, headers['task'])['queue']
+
+    state = move(destination, app=app, source=retired)
+    logger.info('Moved %d messages out of the retired shards %s', state.filtered, retired)
+    return state.filtered
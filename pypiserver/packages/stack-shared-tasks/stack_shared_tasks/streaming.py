@@ -0,0 +1,94 @@
+import functools
+import json
+import time
+from datetime import datetime
+from typing import Any, Callable, Iterator
+
+from celery import Celery
+from celery.exceptions import TimeoutError
+from sqlmodel import Session, col, delete, select
+
+from stack_datamodel import TaskResultChunk
+
+from .deadlines import seconds_until
+
+
+def append_chunk(session: Session, task_id: str, seq: int, chunk: Any) -> None:
+    # merge: a retried task overwrites the chunks of the previous attempt
+    session.merge(TaskResultChunk(task_id=task_id, seq=seq, data=json.dumps(chunk)))
+    session.commit()
+
+
+def streaming(fun: Callable[..., Iterator[Any]]) -> Callable[..., dict]:
+    """
+    Turn a bound task yielding JSON-serializable chunks into a streaming task.
+
+    Each chunk is committed to the chunk store as soon as it is produced, so that the clients read it while the
+    task runs and neither the worker nor the result row ever holds the whole output. The result of the task
+    is the number of chunks.
+
+    Example::
+
+        @app.task(bind=True, name='samples')
+        @streaming
+        def samples(self, n):
+            for start in range(0, n, 1000):
+                yield list(range(start, min(start + 1000, n)))
+    """
+
+    @functools.wraps(fun)
+    def wrapper(self, *args, **kwargs) -> dict:
+        seq = 0
+        session = Session(bind=self.backend.engine)
+        with session:
+            for chunk in fun(self, *args, **kwargs):
+                append_chunk(session, self.request.id, seq, chunk)
+                seq += 1
+        return {'chunks': seq}
+
+    return wrapper
+
+
+def stream_chunks(
+        app: Celery,
+        task_id: str,
+        deadline: datetime,
+        page_size: int = 100,
+        poll_interval: float = 0.2,
+) -> Iterator[str]:
+    """
+    Chunks of a streaming task as JSON documents, as soon as they are stored and until the task completes.
+
+    At most ``page_size`` chunks are held in memory. Raises ``celery.exceptions.TimeoutError`` at the deadline and the exception of
+    the task when it fails. The chunks are deleted once read, or when the stream is given up.
+    """
+    engine = app.backend.engine
+    result = app.AsyncResult(task_id)
+    seq = 0
+    try:
+        while True:
+            # The state is read before the chunks: once the task is ready no chunk can be missed
+            ready = result.ready()
+            with Session(engine) as session:
+                chunks = session.exec(
+                    select(TaskResultChunk.data)
+                    .where(TaskResultChunk.task_id == task_id, col(TaskResultChunk.seq) >= seq)
+                    .order_by(col(TaskResultChunk.seq))
+                    .limit(page_size)
+                ).all()
+            yield from chunks
+            seq += len(chunks)
+            if len(chunks) == page_size:
+                continue
+            if ready:
+                break
+            if seconds_until(deadline) <= 0:
+                raise TimeoutError()
+            time.sleep(poll_interval)
+        # Raises the exception of the failed tasks
+        result.get(timeout=0)
+    finally:
+        # Also when the client went away or the task ran past its deadline: its time limit stops it
+        with Session(engine) as session:
+            session.exec(delete(TaskResultChunk).where(TaskResultChunk.task_id == task_id))
+            session.commit()
@@ -1,6 +1,9 @@
 from celery import shared_task
 
+from .retries import with_retries
+
 
 @shared_task(bind=True, name='add')
+@with_retries()
 def add(self, a: float, b: float) -> float:
     return a + b
@@ -0,0 +1,94 @@
+"""
+Run the pools of the ``worker_topology`` of a worker application, one celery worker per pool.
+
+Each pool consumes its own queues with its own settings, so that cheap tasks never wait behind expensive ones in
+the same pool. Extra arguments are given to every celery worker. Without topology a single worker is run with the
+extra arguments.
+
+Example, as the entrypoint of a worker container::
+
+    python -m stack_shared_tasks.topology worker.main:app -- -l INFO
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+
+from kombu.utils.imports import symbol_by_name
+
+logger = logging.getLogger(__name__)
+
+
+def pool_command(app: str, name: str, pool: dict, extra_args: list[str]) -> list[str]:
+    return ['celery', '-A', app, 'worker', '-n', f'{name}@%h', '-Q', ','.join(pool['queues']), *extra_args]
+
+
+def pool_environment(index: int, name: str, pool: dict, environ: dict[str, str]) -> dict[str, str]:
+    """
+    Environment of the worker of a pool: the settings of the pool override the ``CeleryConfig`` of the worker.
+    """
+    env = dict(environ)
+    for setting, value in pool.items():
+        if setting != 'queues':
+            env[setting.upper()] = value if isinstance(value, str) else json.dumps(value)
+    # The pools of a replica share its shards: only the first one moves the messages of the retired shards
+    if index:
+        env['WORKER_REBALANCE_SHARDS'] = 'false'
+    # Each pool exposes the metrics of its own processes on a port of its own
+    if env.get('METRICS_PORT'):
+        env['METRICS_PORT'] = str(int(env['METRICS_PORT']) + index)
+    if env.get('PROMETHEUS_MULTIPROC_DIR'):
+        env['PROMETHEUS_MULTIPROC_DIR'] = os.path.join(env['PROMETHEUS_MULTIPROC_DIR'], name)
+        os.makedirs(env['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+    return env
+
+
+def run_topology(app: str, topology: dict[str, dict], extra_args: list[str]) -> int:
+    """
+    Start one worker per pool and supervise them: signals are forwarded to all of them (``SIGTERM`` is a warm
+    shutdown), and when one exits the others are shut down so that the container is restarted as a whole.
+    Returns the exit code of the first worker that exited.
+    """
+    workers = {}
+    for index, (name, pool) in enumerate(topology.items()):
+        worker = subprocess.Popen(
+            pool_command(app, name, pool, extra_args),
+            env=pool_environment(index, name, pool, os.environ),
+        )
+        workers[worker.pid] = (name, worker)
+
+    def forward(signum, frame) -> None:
+        for _, worker in workers.values():
+            if worker.poll() is None:
+                worker.send_signal(signum)
+
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGQUIT):
+        signal.signal(signum, forward)
+    pid, status = os.wait()
+    name, _ = workers.pop(pid)
+    code = os.waitstatus_to_exitcode(status)
+    logger.info('Pool %s exited with %d, stopping the others', name, code)
+    forward(signal.SIGTERM, None)
+    for _, worker in workers.values():
+        worker.wait()
+    return code
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('app', help='Celery application, e.g. worker.main:app')
+    parser.add_argument('extra_args', nargs=argparse.REMAINDER, help='Arguments of every celery worker')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    extra_args = args.extra_args[1:] if args.extra_args[:1] == ['--'] else args.extra_args
+    topology = symbol_by_name(args.app).conf.get('worker_topology') or {}
+    if not topology:
+        os.execvp('celery', ['celery', '-A', args.app, 'worker', *extra_args])
+    sys.exit(run_topology(args.app, topology, extra_args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+from celery import Celery
+from celery.signals import (
+    celeryd_after_setup,
+    task_postrun,
+    task_prerun,
+    worker_init,
+    worker_process_init,
+    worker_ready,
+)
+
+from stack_settings import CeleryConfig, Settings
+
+from .app import configure_app
+from .memory import MemoryGovernor
+from .metrics import start_metrics_server
+from .queues import declare_dead_letter_queues
+from .routing import rebalance_shards, worker_shards
+
+
+def configure_worker(app: Celery, settings: Settings, celery_config: CeleryConfig) -> None:
+    """
+    Wire the shared worker machinery into a worker application.
+    """
+    # Workers publish the next links of chains and the retries: they must route exactly like the backend
+    configure_app(app, celery_config)
+
+    @worker_init.connect(weak=False)
+    def start_worker_metrics(**kwargs) -> None:
+        if settings.METRICS_PORT:
+            start_metrics_server(settings.METRICS_PORT)
+
+    @celeryd_after_setup.connect(weak=False)
+    def subscribe_to_shards(sender, instance, **kwargs) -> None:
+        # Runs after the -Q option has been applied: add the shards of the selected queues
+        queues = instance.app.amqp.queues
+        for shard in worker_shards(
+                list(queues.consume_from),
+                celery_config.task_queue_shards,
+                settings.WORKER_REPLICA_INDEX,
+                settings.WORKER_REPLICAS,
+        ):
+            queues.select_add(shard)
+
+    @worker_ready.connect(weak=False)
+    def prepare_queues(sender, **kwargs) -> None:
+        # The dead-letter queues must exist before messages are moved out of the retired shards
+        declare_dead_letter_queues(sender.app, celery_config)
+        if settings.WORKER_REPLICA_INDEX != 0 or not settings.WORKER_REBALANCE_SHARDS:
+            return
+        for queue in {route['queue'] for route in celery_config.task_routes.values()}:
+            rebalance_shards(sender.app, queue, celery_config.task_queue_shards.get(queue, 1))
+
+    governor = MemoryGovernor(
+        celery_config.worker_max_memory_per_child,
+        celery_config.worker_memory_growth_warning,
+        celery_config.worker_memory_track_allocations,
+    )
+
+    @worker_process_init.connect(weak=False)
+    def init_memory_governor(**kwargs) -> None:
+        governor.on_process_init()
+
+    @task_prerun.connect(weak=False)
+    def sample_memory_before(sender, task_id, **kwargs) -> None:
+        governor.before_task(task_id)
+
+    @task_postrun.connect(weak=False)
+    def sample_memory_after(sender, task_id, **kwargs) -> None:
+        governor.after_task(sender, task_id)
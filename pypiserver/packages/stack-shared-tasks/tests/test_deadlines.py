@@ -0,0 +1,18 @@
+from datetime import datetime, timedelta, timezone
+
+from celery import Celery
+from celery.signals import before_task_publish
+
+from stack_shared_tasks.deadlines import message_expired, strip_message_expiration
+
+
+def test_deadline_is_only_carried_by_the_header() -> None:
+    app = Celery(broker='memory://')
+    before_task_publish.connect(strip_message_expiration, weak=False, dispatch_uid='strip_message_expiration')
+    deadline = datetime.now(timezone.utc) + timedelta(minutes=1)
+    app.send_task('add', args=(1, 2), queue='deadlines', expires=deadline)
+    with app.connection_for_read() as connection:
+        message = connection.SimpleQueue('deadlines').get(timeout=1)
+    assert 'expiration' not in message.properties
+    assert message.headers['expires'] == deadline.isoformat()
+    assert not message_expired(message.headers)
@@ -0,0 +1,61 @@
+import time
+
+from stack_shared_tasks.hedging import Hedger, LatencyTracker
+
+
+class FakeResult:
+    def __init__(self, value, ready_at: float):
+        self.value = value
+        self.ready_at = ready_at
+        self.revoked = False
+        self.backend = None
+
+    def ready(self) -> bool:
+        return time.monotonic() >= self.ready_at
+
+    def get(self, timeout=None):
+        return self.value
+
+    def revoke(self) -> None:
+        self.revoked = True
+
+
+def test_latency_percentile() -> None:
+    tracker = LatencyTracker()
+    assert tracker.percentile('add', 95) is None
+    for latency in range(1, 101):
+        tracker.record('add', latency / 100)
+    assert tracker.percentile('add', 50) in (0.5, 0.51)
+    assert tracker.percentile('add', 100) == 1.0
+    assert tracker.percentile('add', 95, min_samples=101) is None
+
+
+def test_hedge_wins_over_straggler() -> None:
+    hedger = Hedger(min_samples=1, min_delay=0.01, budget_ratio=1.0, poll_interval=0.001)
+    hedger.latencies.record('add', 0.01)
+    straggler = FakeResult('primary', time.monotonic() + 10)
+    duplicates = []
+
+    def hedge():
+        duplicates.append(FakeResult('hedge', time.monotonic()))
+        return duplicates[-1]
+
+    assert hedger.run('add', lambda: straggler, hedge, timeout=1.0) == 'hedge'
+    assert len(duplicates) == 1
+    assert straggler.revoked
+    # Measured from the first send: the hedge delay is part of the latency
+    assert hedger.latencies.percentile('add', 100) > 0.01
+
+
+def test_hedging_capped_by_budget() -> None:
+    hedger = Hedger(min_samples=1, min_delay=0.001, budget_ratio=0.0, poll_interval=0.001)
+    hedger.latencies.record('add', 0.001)
+    duplicates = []
+    result = hedger.run(
+        'add',
+        lambda: FakeResult('primary', time.monotonic() + 0.02),
+        lambda: duplicates.append(1),
+        timeout=1.0,
+    )
+    assert result == 'primary'
+    assert not duplicates
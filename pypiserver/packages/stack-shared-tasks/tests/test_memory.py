@@ -0,0 +1,47 @@
+import logging
+import tracemalloc
+from types import SimpleNamespace
+
+from prometheus_client import REGISTRY
+
+from stack_shared_tasks.memory import MemoryGovernor
+
+leaked = []
+
+
+def sample(name: str) -> float:
+    return REGISTRY.get_sample_value(name, {'task': 'leaky'}) or 0.0
+
+
+def test_growth_is_charged_to_the_task(caplog) -> None:
+    governor = MemoryGovernor(max_memory_kb=1, growth_warning=10_240, track_allocations=True)
+    task = SimpleNamespace(name='leaky', request=SimpleNamespace(id='1'))
+    growth, recycles = sample('celery_task_memory_growth_kilobytes_total'), sample('celery_worker_child_recycles_total')
+    governor.on_process_init()
+    try:
+        with caplog.at_level(logging.WARNING, logger='stack_shared_tasks.memory'):
+            governor.before_task('1')
+            leaked.append(bytearray(b'x' * 50 * 1024 * 1024))
+            governor.after_task(task, '1')
+    finally:
+        tracemalloc.stop()
+        leaked.clear()
+    assert sample('celery_task_memory_growth_kilobytes_total') - growth >= 40 * 1024
+    assert sample('celery_worker_child_recycles_total') == recycles + 1
+    # The allocation site is reported with the task
+    assert 'leaky[1] grew the process' in caplog.text
+    assert 'test_memory.py' in caplog.text
+
+
+def test_concurrent_tasks_keep_their_own_samples(monkeypatch) -> None:
+    governor = MemoryGovernor(max_memory_kb=None, growth_warning=10_240)
+    task = SimpleNamespace(name='leaky', request=SimpleNamespace(id='1'))
+    growth = sample('celery_task_memory_growth_kilobytes_total')
+    rss = iter([1000, 5000, 1500, 5200])
+    monkeypatch.setattr('stack_shared_tasks.memory.rss_kb', lambda: next(rss))
+    # Task 1 starts, task 2 starts after it grew the process, task 1 ends, then task 2
+    governor.before_task('1')
+    governor.before_task('2')
+    governor.after_task(task, '1')
+    governor.after_task(task, '2')
+    assert sample('celery_task_memory_growth_kilobytes_total') - growth == 500 + 200
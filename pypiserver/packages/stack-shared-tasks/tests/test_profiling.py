@@ -0,0 +1,22 @@
+import time
+
+from stack_shared_tasks.profiling import StackSampler
+
+
+def busy(seconds: float) -> None:
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+def test_sampler_collapses_stacks_below_its_frame() -> None:
+    with StackSampler(interval=0.001) as sampler:
+        busy(0.2)
+    assert sampler.duration >= 0.2
+    assert sampler.stacks
+    lines = sampler.collapsed().splitlines()
+    stack, count = lines[0].rsplit(' ', 1)
+    # Most sampled first, rooted at the frame the sampler was started in
+    assert stack.startswith('busy (test_profiling.py:')
+    assert int(count) == max(sampler.stacks.values())
+    assert not any('test_sampler_collapses_stacks_below_its_frame' in line for line in lines)
@@ -0,0 +1,28 @@
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from celery.exceptions import Reject
+
+from stack_shared_tasks.retries import dead_letter
+
+
+def make_task(dead_letter: bool) -> SimpleNamespace:
+    return SimpleNamespace(
+        acks_late=True, dead_letter=dead_letter, backend=Mock(), request=SimpleNamespace(id='task-id')
+    )
+
+
+def test_opted_in_task_is_dead_lettered() -> None:
+    task = make_task(dead_letter=True)
+    exc = ConnectionError('down')
+    with pytest.raises(Reject) as info:
+        dead_letter(task, exc)
+    assert info.value.reason is exc and not info.value.requeue
+    task.backend.mark_as_failure.assert_called_once_with('task-id', exc, request=task.request)
+
+
+def test_other_task_fails_as_usual() -> None:
+    task = make_task(dead_letter=False)
+    dead_letter(task, ConnectionError('down'))
+    task.backend.mark_as_failure.assert_not_called()
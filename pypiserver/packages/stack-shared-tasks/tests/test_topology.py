@@ -0,0 +1,18 @@
+from stack_shared_tasks.topology import pool_command, pool_environment
+
+
+def test_pool_settings_override_the_worker_configuration(tmp_path) -> None:
+    pool = {'queues': ['shared', 'shared.0'], 'worker_pool': 'threads', 'worker_concurrency': 4}
+    env = pool_environment(1, 'light', pool, {'METRICS_PORT': '9100', 'PROMETHEUS_MULTIPROC_DIR': str(tmp_path)})
+    assert env['WORKER_POOL'] == 'threads'
+    assert env['WORKER_CONCURRENCY'] == '4'
+    assert 'QUEUES' not in env
+    # Only the first pool rebalances the shards
+    assert env['WORKER_REBALANCE_SHARDS'] == 'false'
+    assert 'WORKER_REBALANCE_SHARDS' not in pool_environment(0, 'heavy', pool, {})
+    # Each pool exposes its own metrics
+    assert env['METRICS_PORT'] == '9101'
+    assert (tmp_path / 'light').is_dir()
+    assert pool_command('worker.main:app', 'light', pool, ['-l', 'INFO']) == [
+        'celery', '-A', 'worker.main:app', 'worker', '-n', 'light@%h', '-Q', 'shared,shared.0', '-l', 'INFO'
+    ]
@@ -5,19 +5,25 @@ from stack_datamodel.tasks import (
     BinaryOperandsPayloadSchema,
     BinaryOperationResultSchema
 )
+from stack_shared_tasks.backends import BatchedDatabaseBackend, backend_url
+from stack_shared_tasks.retries import with_retries
+from stack_shared_tasks.worker import configure_worker
 
 app = Celery(
     settings.PROJECT_NAME,
     broker=str(settings.RABBITMQ_URI),
-    backend=str(settings.CELERY_BACKEND_DB_URI),
+    backend=backend_url(settings.CELERY_BACKEND_DB_URI, BatchedDatabaseBackend),
+    task_cls='stack_shared_tasks.base:StackTask',
 )
 app.config_from_object(celery_config)
+configure_worker(app, settings, celery_config)
 app.autodiscover_tasks(
     packages=['stack_shared_tasks']
 )
 
 
 @app.task(bind=True, name='multiply')
+@with_retries()
 def multiply(self, **payload) -> BinaryOperationResultSchema:
     payload = BinaryOperandsPayloadSchema(**payload)
     return BinaryOperationResultSchema(s=payload.a * payload.b)
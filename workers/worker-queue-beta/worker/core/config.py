@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Dict, Union
 
 from stack_settings import Settings as GeneralSettings
 from stack_settings import CeleryConfig as GeneralCeleryConfig
@@ -19,14 +19,32 @@ class CeleryConfig(GeneralCeleryConfig):
     worker_prefetch_multiplier: int = 1
 
     # Maximum number of tasks a pool worker process can execute before it’s replaced with a new one. None = no limit
-    worker_max_tasks_per_child: Union[None, int] = None
+    # (scipy/NumPy caches and fragmentation grow the processes slowly)
+    worker_max_tasks_per_child: Union[None, int] = 1000
 
     # Maximum amount of resident memory, in kilobytes,
     # that may be consumed by a worker before it will be replaced by a new worker.
-    worker_max_memory_per_child: Union[None, int] = None
+    # Keep it under the memory limit of the container divided by the concurrency.
+    worker_max_memory_per_child: Union[None, int] = 1_048_576
 
     # Name of the pool class used by the worker.
     worker_pool: str = 'prefork'
 
+    # The cheap shared tasks have a pool of their own: they never wait behind the scipy tasks of the beta queue.
+    # Settings of a pool override the ones above in its worker.
+    worker_topology: Dict[str, dict] = {
+        'light': {
+            'queues': ['shared'],
+            # prefork enforces the time limits of the tasks, the threads pool does not
+            'worker_pool': 'prefork',
+            'worker_concurrency': 4,
+        },
+        'heavy': {
+            'queues': ['beta'],
+            'worker_pool': 'prefork',
+            'worker_concurrency': 1,
+        },
+    }
+
 
 celery_config = CeleryConfig()
@@ -1,27 +1,53 @@
+from functools import lru_cache
+
 from .core.config import settings, celery_config
 from celery import Celery
 
-from stack_datamodel.tasks import SampleBaseRandomVariablePayloadSchema, SampleResultSchema
+from stack_datamodel.tasks import SampleBaseRandomVariablePayloadSchema, SampleResultSchema, SampleStreamPayloadSchema
+from stack_shared_tasks.backends import BatchedDatabaseBackend, backend_url
+from stack_shared_tasks.retries import with_retries
+from stack_shared_tasks.streaming import streaming
+from stack_shared_tasks.worker import configure_worker
 
 from scipy import stats
 
 app = Celery(
     settings.PROJECT_NAME,
     broker=str(settings.RABBITMQ_URI),
-    backend=str(settings.CELERY_BACKEND_DB_URI),
+    backend=backend_url(settings.CELERY_BACKEND_DB_URI, BatchedDatabaseBackend),
+    task_cls='stack_shared_tasks.base:StackTask',
 )
 app.config_from_object(celery_config)
+configure_worker(app, settings, celery_config)
 app.autodiscover_tasks(
     packages=['stack_shared_tasks']
 )
 
 
-@app.task(bind=True, name='sample-normal')
+@lru_cache(maxsize=256)
+def frozen_normal(loc: float, scale: float):
+    # Per-process cache: submit with an affinity key (e.g. "loc:scale") to keep hitting the same workers
+    return stats.norm(loc=loc, scale=scale)
+
+
+# The sampling tasks are expensive: their message is dead-lettered once their retries are exhausted, to be replayed
+@app.task(bind=True, name='sample-normal', dead_letter=True)
+@with_retries()
 def sample_student(self, **payload) -> SampleResultSchema:
     payload = SampleBaseRandomVariablePayloadSchema(**payload)
-    d = stats.norm(loc=payload.loc, scale=payload.scale)
+    d = frozen_normal(payload.loc, payload.scale)
     return SampleResultSchema(s=d.rvs(1))
 
 
+@app.task(bind=True, name='sample-normal-stream', dead_letter=True)
+@with_retries()
+@streaming
+def sample_normal_stream(self, **payload):
+    payload = SampleStreamPayloadSchema(**payload)
+    d = frozen_normal(payload.loc, payload.scale)
+    for start in range(0, payload.size, payload.chunk_size):
+        yield d.rvs(min(payload.chunk_size, payload.size - start)).tolist()
+
+
 if __name__ == '__main__':
     app.start()